@@ -4,6 +4,7 @@ Module for logger.
 Contains the LoggerManager model.
 """
 import logging
+import logging.config
 from logging.handlers import RotatingFileHandler
 from typing import Dict
 from pathlib import Path
@@ -0,0 +1,106 @@
+"""
+Artifact worker module.
+
+Contains the ArtifactWorker model.
+"""
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from typing import Callable, Dict, Hashable
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import txt_to_pdf
+
+
+log = logging.getLogger(__name__)
+
+# Maximum number of concurrent final form builds (threads) & PDF renders
+# (processes).
+MAX_BUILDS = 4
+MAX_RENDERS = 2
+
+
+
+class ArtifactWorker:
+    """
+    ArtifactWorker model.
+    
+    Builds the final form outputs (e.g., category PDFs & classification CSVs)
+    in the background, off of the request path. PDFs are rendered in a process
+    pool.
+    
+    Builds are keyed (e.g., by subpath & stage). Triggers for a key w/ a build
+    still pending are merged (i.e., the latest build replaces the pending one),
+    & builds of the same key never run concurrently.
+    
+    Note: A single instance (`artifact_worker`) is shared across
+    OutputProcessers.
+    """
+    def __init__(self, max_builds: int = MAX_BUILDS, max_renders: int = MAX_RENDERS):
+        self.max_renders = max_renders
+        self._executor = ThreadPoolExecutor(max_workers=max_builds)
+        self._renderer = None
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Callable] = {}
+        self._scheduled: Dict[Hashable, Future] = {}
+    
+    def submit(self, key: Hashable, build: Callable[[], None]):
+        """
+        Schedules a build for a key. Returns the Future of the key's build.
+        """
+        with self._lock:
+            self._pending[key] = build
+            if key not in self._scheduled:
+                self._scheduled[key] = self._executor.submit(self._run, key)
+            return self._scheduled[key]
+    
+    def _run(self, key: Hashable):
+        """
+        Runs the pending build(s) of a key, until none are pending.
+        """
+        while True:
+            with self._lock:
+                if key not in self._pending:
+                    self._scheduled.pop(key, None)
+                    return None
+                build = self._pending.pop(key)
+            try:
+                build()
+            except Exception as e:
+                log.exception(f"Final form build failed for {key}: {e}")
+    
+    def render_pdf(self, text: str, file_path: Path):
+        """
+        Renders text as a PDF (in the process pool) & waits for it.
+        """
+        with self._lock:
+            # Processes are spawned (not forked), as the worker is threaded.
+            if self._renderer is None:
+                self._renderer = ProcessPoolExecutor(
+                    max_workers=self.max_renders,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+        try:
+            return self._renderer.submit(txt_to_pdf, text, file_path).result()
+        except BrokenProcessPool as e:
+            # E.g., if the main module cannot be safely imported by spawned
+            # processes. Rendered in the worker thread instead.
+            log.warning(f"PDF process pool unavailable ({e}). Rendering in thread.")
+            return txt_to_pdf(text, file_path)
+    
+    def wait(self):
+        """
+        Waits for all scheduled builds.
+        """
+        while True:
+            with self._lock:
+                futures = list(self._scheduled.values())
+            if not futures:
+                return None
+            for future in futures:
+                future.result()
+
+
+artifact_worker = ArtifactWorker()
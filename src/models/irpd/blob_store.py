@@ -0,0 +1,70 @@
+"""
+Blob store module.
+
+Contains the BlobStore model.
+"""
+import os
+import zlib
+import logging
+import threading
+from pathlib import Path
+
+from utils import content_hash
+
+
+log = logging.getLogger(__name__)
+
+# Blob store dir., shared by the tests in a test dir.
+BLOBS_DIR = "_blobs"
+
+
+
+class BlobStore:
+    """
+    BlobStore model.
+    
+    A content-addressed store of prompt texts. Each text is stored once (zlib
+    compressed) under its content hash, & referenced by the hash from the
+    manifests of the subsets it is used in. The static Stage 2 & 3 system
+    prompt, for example, is then stored once across windows, subsets,
+    replications & tests.
+    """
+    def __init__(self, blobs_path: Path):
+        self.blobs_path = Path(blobs_path)
+        self._lock = threading.Lock()
+        self._known = set()
+    
+    def _blob_path(self, digest: str):
+        """
+        Returns the path of a blob (sharded by the first two hash chars.).
+        """
+        return self.blobs_path / digest[:2] / f"{digest[2:]}.z"
+    
+    def put(self, text: str) -> str:
+        """
+        Stores a text (if not already stored). Returns its content hash.
+        """
+        digest = content_hash(text)
+        with self._lock:
+            if digest in self._known:
+                return digest
+        
+        path = self._blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            
+            # Written atomically, so a blob is never torn (concurrent writers
+            # of the same blob write identical content).
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(zlib.compress(text.encode("utf-8")))
+            os.replace(tmp_path, path)
+        
+        with self._lock:
+            self._known.add(digest)
+        return digest
+    
+    def get(self, digest: str) -> str:
+        """
+        Returns the text of a content hash.
+        """
+        return zlib.decompress(self._blob_path(digest).read_bytes()).decode("utf-8")
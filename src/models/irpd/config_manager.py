@@ -9,6 +9,9 @@ from utils import create_directory
 from tools.functions import instance_types
 from models.llm_model import LLMModel
 from models.irpd.test_config import TestConfig
+from models.irpd.test_outputs import ModelInfo
+from models.irpd.blob_store import BLOBS_DIR
+from models.irpd.data_store import DATA_CACHE_DIR
 
 
 log = logging.getLogger(__name__)
@@ -20,10 +23,11 @@ class ConfigManager:
     ConfigManger model.
     
     Used to generate subpaths, meta-paths, subsets, and llm instances for a 
-    given TestConfig.
+    given TestConfig. If read only, subpath dirs. are not created.
     """
-    def __init__(self, test_config: TestConfig):
+    def __init__(self, test_config: TestConfig, read_only: bool = False):
         self.config = test_config
+        self.read_only = read_only
         self.stages = test_config.stages
         self.cases = test_config.cases
         self.test_path = test_config.test_path
@@ -42,7 +46,7 @@ class ConfigManager:
         subpath = self.test_path
         if len(self.llms) > 1: subpath = subpath / llm_str
         if self.total_replications > 1: subpath = subpath / f"replication_{n}"
-        if not subpath.exists():
+        if not (subpath.exists() or self.read_only):
             create_directory(subpath)
         return subpath
     
@@ -53,6 +57,38 @@ class ConfigManager:
         subpath = self.generate_subpath(n, llm_str)
         return subpath / "_test_meta.json"
     
+    def generate_journal_path(self, n: int, llm_str: str):
+        """
+        Generates the path for the output journal. File exists for each subpath.
+        """
+        subpath = self.generate_subpath(n, llm_str)
+        return subpath / "_journal.jsonl"
+    
+    def generate_subset_path(self, n: int, llm_str: str, stage_name: str, subset: str):
+        """
+        Generates the path for a given stage subset (i.e., the parent dir. of 
+        the prompts & responses dirs.).
+        """
+        subpath = self.generate_subpath(n, llm_str)
+        return subpath / f"stage_{stage_name}" / subset
+    
+    def generate_blobs_path(self):
+        """
+        Generates the path for the prompt blob store. Dir. is shared by the 
+        tests in the test dir. (e.g., the tests of an IntraModel instance).
+        """
+        return self.test_path.parent / BLOBS_DIR
+    
+    def generate_data_cache_path(self):
+        """
+        Generates the path for the Parquet data cache (see DataStore). Dir. is
+        shared by the tests in the test dir. None if the test does not cache
+        data (see `data_cache` test option), or if read only.
+        """
+        if not self.config.data_cache or self.read_only:
+            return None
+        return self.test_path.parent / DATA_CACHE_DIR
+    
     def get_subsets(self, stage_name: str):
         """
         Generates subsets for a given stage.
@@ -67,6 +103,17 @@ class ConfigManager:
             subsets += [f"{c}_{i}" for c, i in prod]
         return subsets
     
+    def generate_model_info(self, llm_str: str):
+        """
+        Returns the ModelInfo (model & parameters) of a LLM, w/o creating the 
+        LLM instance.
+        """
+        llm = getattr(LLMModel, llm_str)
+        
+        # Same as the LLM instance, default configs are used if not valid.
+        configs = llm.get_configs(self.llm_config) or llm.model_class.impl[1]()
+        return ModelInfo(model=llm.model_name, parameters=configs.model_dump())
+    
     def generate_llm_instance(self, llm_str: str, print_reponse: bool = False):
         """
         Returns the LLM model instance from the /llms package.
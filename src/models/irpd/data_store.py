@@ -0,0 +1,154 @@
+"""
+Data store module.
+
+Contains the DataStore model.
+"""
+import logging
+import threading
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+
+from utils import content_hash, create_directory
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+log = logging.getLogger(__name__)
+
+# Maximum ratio of unique values to rows for a string column to be stored as
+# a categorical.
+CATEGORICAL_RATIO = 0.5
+
+# Parquet data cache dir., shared by the tests in a test dir.
+DATA_CACHE_DIR = "_data_cache"
+
+
+
+class DataStore:
+    """
+    DataStore model.
+    
+    Loads each data file (e.g., the RA summaries & raw CSVs) once per process,
+    w/ low cardinality string columns (e.g., case & treatment) as categoricals.
+    A file is reloaded if modified.
+    
+    If a cache dir. is given (see `data_cache` test option) & pyarrow is 
+    installed, a Parquet copy of each CSV is cached in it, & read memory 
+    mapped on later loads (i.e., by later processes). Data dirs. are never 
+    written to.
+    
+    The RA summaries are partitioned by (case, treatment), so the summaries of
+    a test are served w/o filtering the whole dataset.
+    
+    Note: A single instance (`data_store`) is shared by TestPrompts &
+    OutputProcessers. Returned DataFrames are shared, so must not be modified
+    in place.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames: Dict[Path, Tuple[int, pd.DataFrame]] = {}
+        self._partitions: Dict[Path, Tuple[pd.DataFrame, Dict[tuple, pd.DataFrame]]] = {}
+    
+    @staticmethod
+    def _categorize(df: pd.DataFrame):
+        """
+        Converts low cardinality string columns to categoricals.
+        """
+        for col in df.columns:
+            if not pd.api.types.is_string_dtype(df[col]):
+                continue
+            if df[col].nunique() <= CATEGORICAL_RATIO * len(df):
+                df[col] = df[col].astype("category")
+        return df
+    
+    @staticmethod
+    def _read(csv_path: Path, mtime: int, cache_dir: Optional[Path] = None):
+        """
+        Reads a CSV file (or its cached Parquet copy in the cache dir., if not
+        older than the CSV). Cached copies are named by the CSV name & a hash
+        of its path, so CSVs of different data dirs. do not collide.
+        """
+        if not (pq and cache_dir):
+            return DataStore._categorize(pd.read_csv(csv_path))
+        
+        path_hash = content_hash(csv_path.resolve().as_posix())[:12]
+        cache_path = Path(cache_dir) / f"{csv_path.stem}-{path_hash}.parquet"
+        if cache_path.exists() and cache_path.stat().st_mtime_ns >= mtime:
+            return pq.read_table(cache_path, memory_map=True).to_pandas()
+        
+        df = DataStore._categorize(pd.read_csv(csv_path))
+        try:
+            create_directory(cache_dir)
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), cache_path)
+        except (OSError, pa.ArrowException) as e:
+            log.warning(f"Parquet cache not written for {csv_path}: {e}")
+        return df
+    
+    def load(self, csv_path: Path, cache_dir: Optional[Path] = None) -> pd.DataFrame:
+        """
+        Returns the DataFrame of a CSV file (loaded once, unless modified). If
+        a cache dir., its Parquet copy is cached in the dir.
+        """
+        csv_path = Path(csv_path)
+        mtime = csv_path.stat().st_mtime_ns
+        with self._lock:
+            cached = self._frames.get(csv_path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        
+        df = self._read(csv_path, mtime, cache_dir)
+        with self._lock:
+            self._frames[csv_path] = (mtime, df)
+        return df
+    
+    def _summary_partitions(self, summary_path: Path, cache_dir: Optional[Path] = None):
+        """
+        Returns the RA summaries partitioned by (case, treatment). Partitions 
+        are rebuilt if the summaries are reloaded.
+        """
+        df = self.load(summary_path, cache_dir)
+        with self._lock:
+            cached = self._partitions.get(summary_path)
+            if cached and cached[0] is df:
+                return cached[1]
+        
+        partitions = {
+            (str(case), str(treatment)): partition
+            for (case, treatment), partition in df.groupby(
+                ["case", "treatment"], observed=True, sort=False
+            )
+        }
+        with self._lock:
+            self._partitions[summary_path] = (df, partitions)
+        return partitions
+    
+    def summaries(
+        self,
+        summary_path: Path,
+        cases: List[str],
+        treatment: str,
+        cache_dir: Optional[Path] = None
+    ):
+        """
+        Returns the RA summaries for cases & a treatment ('merged' for all
+        treatments), in the order of the file.
+        """
+        partitions = self._summary_partitions(Path(summary_path), cache_dir)
+        frames = [
+            partition for (case, t), partition in partitions.items()
+            if case in cases and (treatment == "merged" or t == treatment)
+        ]
+        if len(frames) == 1:
+            return frames[0]
+        if not frames:
+            return self.load(summary_path, cache_dir).iloc[0:0]
+        return pd.concat(frames).sort_index()
+
+
+data_store = DataStore()
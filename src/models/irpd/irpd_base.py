@@ -6,14 +6,19 @@ methods.
 """
 import re
 import logging
+import pandas as pd
 from typing import List, Optional, Union, Dict
 from pathlib import Path
 from abc import ABC, abstractmethod
 
 from utils import get_env_var, to_list
+from tools.functions import categories_to_txt, estimate_tokens
 from logger import clear_logger
 from models.irpd.test_config import TestConfig
 from models.irpd.test_runner import TestRunner
+from models.irpd.test_scheduler import TestScheduler
+from models.irpd.test_planner import TestPlanner
+from models.irpd.output_manager import OutputManager
 
 
 log = logging.getLogger(__name__)
@@ -35,7 +40,21 @@ class IRPDBase(ABC):
         prompts_path: Optional[Union[str, Path]] = None,
         data_path: Optional[Union[str, Path]] = None,
         test_paths: Optional[List[str]] = None,
-        batch: bool = False
+        batch: bool = False,
+        category_ids: bool = False,
+        reasoning: bool = True,
+        user_format: str = "records",
+        max_examples: Optional[int] = None,
+        max_reasoning_chars: Optional[int] = None,
+        shard_tokens: Optional[int] = None,
+        tree_merge: bool = False,
+        export_only: bool = False,
+        packed: bool = False,
+        prompt_blobs: bool = False,
+        parsed_only: bool = False,
+        hot_stages: Optional[int] = None,
+        data_cache: bool = False,
+        read_only: bool = False
     ):
         self.cases = to_list(cases)
         self.ras = to_list(ras)
@@ -46,18 +65,39 @@ class IRPDBase(ABC):
         self.test_paths = to_list(test_paths or [])
         self.batch_request = batch
         
+        # If read only, OutputManagers do not write to the test paths (i.e., 
+        # for `plan`), so tests cannot be run.
+        self.read_only = read_only
+        
         if max_instances:
             assert max_instances >= 1, "`max_instances` must be greater than 0."
         self.max_instances = max_instances
         
         assert N >= 1, "`N` must be greater than 0."
         self.replications = N
-
+        
         # If paths not specified, using env variable.
         self.output_path = Path(output_path or get_env_var("OUTPUT_PATH"))
         self.prompts_path = Path(prompts_path or get_env_var("PROMPTS_PATH"))
         self.data_path = Path(data_path or get_env_var("DATA_PATH"))
         
+        # Options passed through to every TestConfig.
+        self.test_options = {
+            "category_ids": category_ids,
+            "reasoning": reasoning,
+            "user_format": user_format,
+            "max_examples": max_examples,
+            "max_reasoning_chars": max_reasoning_chars,
+            "shard_tokens": shard_tokens,
+            "tree_merge": tree_merge,
+            "export_only": export_only,
+            "packed": packed,
+            "prompt_blobs": prompt_blobs,
+            "parsed_only": parsed_only,
+            "hot_stages": hot_stages,
+            "data_cache": data_cache
+        }
+        
         # Initializing configs and outputs attrbs.
         self.configs = {}
         self.outputs = {}
@@ -77,7 +117,7 @@ class IRPDBase(ABC):
                 "test_paths must be the same length as the number of test configs."
             )
         return test_paths
-
+    
     @staticmethod
     def _get_max_test_number(directory: Path, prefix: str = "test_"):
         """
@@ -100,7 +140,7 @@ class IRPDBase(ABC):
             return {k: self.configs[k] for k in config_ids if k in self.configs}
         else:
             return self.configs
-
+    
     def add_configs(self, configs: Union[TestConfig, List[TestConfig]]):
         """
         Method to add test configs to configs attrb.
@@ -120,7 +160,7 @@ class IRPDBase(ABC):
                 )
                 continue
             self.configs[config.id] = config
-
+    
     @abstractmethod
     def _generate_test_paths(self):
         """
@@ -136,14 +176,138 @@ class IRPDBase(ABC):
         """
         pass
     
+    def category_prompt_report(self, config_ids: Union[str, List[str]] = None):
+        """
+        Returns a DataFrame of the estimated tokens of the 'Categories' section
+        of the stage 2 & 3 system prompts, for full & compact (as specified by
+        the test config) category rendering.
+        
+        Only includes tests (LLMs & replications) w/ stored categories.
+        """
+        report = []
+        test_configs: Dict[str, TestConfig] = self._get_test_configs(config_ids=config_ids)
+        for config_id, config in test_configs.items():
+            output_manager = self.outputs[config_id]
+            for llm_str, test_output in output_manager.test_outputs.items():
+                replications = sorted({
+                    output.replication for output in test_output.stage_outputs
+                })
+                for n in replications:
+                    categories = output_manager.get_categories(llm_str, n)
+                    if not categories:
+                        continue
+                    full_tokens = estimate_tokens(
+                        categories_to_txt(categories, config.category_ids)
+                    )
+                    compact_tokens = estimate_tokens(categories_to_txt(
+                        categories,
+                        config.category_ids,
+                        config.max_examples,
+                        config.max_reasoning_chars
+                    ))
+                    report.append({
+                        "config": config_id,
+                        "case": config.case,
+                        "llm": llm_str,
+                        "replication": n,
+                        "categories": len(categories),
+                        "full_tokens": full_tokens,
+                        "compact_tokens": compact_tokens,
+                        "savings": 1 - compact_tokens / full_tokens
+                    })
+        return pd.DataFrame(report)
+    
+    def verify(
+        self,
+        config_ids: Union[str, List[str]] = None,
+        max_workers: Optional[int] = None
+    ):
+        """
+        Verifies the written responses of each test config against their 
+        manifests (content hashes & schema validation), in parallel. 
+        
+        By default, complete outputs are trusted from their manifests on 
+        initialization. Outputs w/ invalid responses are marked incomplete, & 
+        are re-requested in the next run. Returns a dictionary of config IDs to
+        their invalid response paths.
+        """
+        test_configs: Dict[str, TestConfig] = self._get_test_configs(config_ids=config_ids)
+        return {
+            config_id: self.outputs[config_id].verify(max_workers)
+            for config_id in test_configs
+        }
+    
+    def export(self, config_ids: Union[str, List[str]] = None):
+        """
+        Builds the final form outputs (e.g., category PDFs & classification 
+        CSVs) of all complete stages for each test config, & waits for them.
+        
+        Used for tests w/ `export_only`, or to rebuild the final forms.
+        """
+        assert not self.read_only, "Tests cannot be exported if read only."
+        test_configs: Dict[str, TestConfig] = self._get_test_configs(config_ids=config_ids)
+        for config_id in test_configs:
+            self.outputs[config_id].export()
+        return None
+    
+    def plan(
+        self,
+        config_ids: Union[str, List[str]] = None,
+        concurrency: int = 1,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        output_tokens: Optional[Dict[str, int]] = None
+    ):
+        """
+        Plans (i.e., dry runs) the defined test configs. Composes the prompts
+        of every incomplete stage w/o requesting them. Returns a DataFrame of 
+        the estimated requests, input & output tokens, cost (USD) & wall time
+        (seconds), per LLM & stage.
+        
+        Planning is read only: outputs are read from the test paths w/ read 
+        only OutputManagers, so no manifests, journals, or data caches are 
+        written, & pending batches are not checked (i.e., are planned as 
+        incomplete stages). To not write to the test paths on initialization
+        either, initialize w/ `read_only` (as `plan.py` does).
+        
+        Args:
+            config_ids (Union[str, List[str]], optional): If specified, will 
+            only plan the config ids defined. Otherwise plans all test configs.
+            Defaults to None.
+            concurrency (int, optional): The number of concurrent requests per
+            LLM (1 if run w/o the TestScheduler). Defaults to 1.
+            requests_per_minute (Optional[int], optional): The request rate 
+            limit per LLM. Defaults to None (no limit).
+            tokens_per_minute (Optional[int], optional): The token rate limit 
+            per LLM. Defaults to None (no limit).
+            output_tokens (Optional[Dict[str, int]], optional): The output 
+            tokens per request for stages (e.g., {"2": 150}). Defaults to None
+            (calibrated from completed stages, or the plan config defaults).
+        """
+        test_configs: Dict[str, TestConfig] = self._get_test_configs(config_ids=config_ids)
+        planner = TestPlanner(
+            test_configs,
+            {
+                k: self.outputs[k] if self.read_only else OutputManager(config, read_only=True)
+                for k, config in test_configs.items()
+            },
+            concurrency,
+            requests_per_minute,
+            tokens_per_minute,
+            output_tokens
+        )
+        return planner.plan()
+    
     def run(
         self,
         config_ids: Union[str, List[str]] = None,
-        print_response: bool = False
+        print_response: bool = False,
+        concurrent: bool = False,
+        provider_limits: Optional[Dict[str, int]] = None
     ):
         """
         Runs IRPD based on the defined test configs.
-
+        
         Args:
             config_ids (Union[str, List[str]], optional): If specified, will 
             only run the config ids defined. Otherwise runs all test configs. 
@@ -151,10 +315,31 @@ class IRPDBase(ABC):
             print_response (bool, optional): If True, prints the LLM request for
             each chat completion request. If batch, this arg. is null. Defaults 
             to False.
+            concurrent (bool, optional): If True, non-batch test configs are 
+            run w/ the TestScheduler, where each (config, LLM, replication, 
+            stage, subset) is run as soon as its prior stage is complete. 
+            Defaults to False.
+            provider_limits (Optional[Dict[str, int]], optional): The maximum
+            number of concurrent requests per LLM provider (e.g., {"GPT": 8}), 
+            if concurrent. Defaults to None (4 per provider).
         """
+        assert not self.read_only, "Tests cannot be run if read only."
         clear_logger(app=False)
         test_configs: Dict[str, TestConfig] = self._get_test_configs(config_ids=config_ids)
         
+        if concurrent:
+            scheduled = {k: v for k, v in test_configs.items() if not v.batches}
+            scheduler = TestScheduler(
+                scheduled,
+                {k: self.outputs[k] for k in scheduled},
+                print_response,
+                provider_limits
+            )
+            self.outputs.update(scheduler.run())
+            
+            # Batch test configs are run sequentially.
+            test_configs = {k: v for k, v in test_configs.items() if v.batches}
+        
         for config_id, config in test_configs.items():
             output_manager = self.outputs[config_id]
             
@@ -32,7 +32,8 @@ class CrossModel(IRPDBase):
         prompts_path: Optional[Union[str, Path]] = None,
         data_path: Optional[Union[str, Path]] = None,
         test_paths: Optional[List[str]] = None,
-        batch: bool = False
+        batch: bool = False,
+        **kwargs
     ):
         super().__init__(
             cases,
@@ -47,7 +48,8 @@ class CrossModel(IRPDBase):
             prompts_path,
             data_path,
             test_paths,
-            batch
+            batch,
+            **kwargs
         )
         self.test_type = "cross_model"
         
@@ -85,9 +87,11 @@ class CrossModel(IRPDBase):
                 prompts_path=self.prompts_path,
                 test_path=self.test_paths[idx],
                 batches=self.batch_request,
-                stages=self.stages
+                stages=self.stages,
+                total_replications=self.replications,
+                **self.test_options
             )
             self.configs[config.id] = config
-            self.outputs[config.id] = OutputManager(config)
+            self.outputs[config.id] = OutputManager(config, self.read_only)
         return None
     
\ No newline at end of file
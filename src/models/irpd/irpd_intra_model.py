@@ -8,6 +8,7 @@ from itertools import product
 from typing import Optional, List, Union
 from pathlib import Path
 
+from utils import to_list
 from models.irpd.irpd_base import IRPDBase
 from models.irpd.test_config import TestConfig
 from models.irpd.output_manager import OutputManager
@@ -32,7 +33,8 @@ class IntraModel(IRPDBase):
         prompts_path: Optional[Union[str, Path]] = None,
         data_path: Optional[Union[str, Path]] = None,
         test_paths: Optional[List[str]] = None,
-        batch: bool = False
+        batch: bool = False,
+        **kwargs
     ):
         super().__init__(
             cases,
@@ -47,7 +49,8 @@ class IntraModel(IRPDBase):
             prompts_path,
             data_path,
             test_paths,
-            batch
+            batch,
+            **kwargs
         )
         self.test_type = "cross_model"
         
@@ -77,7 +80,7 @@ class IntraModel(IRPDBase):
                 case=case,
                 ra=ra,
                 treatment=treatment,
-                llms=llm,
+                llms=to_list(llm),
                 llm_config=llm_config,
                 max_instances=self.max_instances,
                 test_type=self.test_type,
@@ -85,8 +88,10 @@ class IntraModel(IRPDBase):
                 prompts_path=self.prompts_path,
                 test_path=self.test_paths[idx],
                 batches=self.batch_request,
-                stages=self.stages
+                stages=self.stages,
+                total_replications=self.replications,
+                **self.test_options
             )
             self.configs[config.id] = config
-            self.outputs[config.id] = OutputManager(config)
+            self.outputs[config.id] = OutputManager(config, self.read_only)
         return None
@@ -29,7 +29,8 @@ class SampleSplitting(IRPDBase):
         prompts_path: Optional[Union[str, Path]] = None,
         data_path: Optional[Union[str, Path]] = None,
         test_paths: Optional[List[str]] = None,
-        batch: bool = False
+        batch: bool = False,
+        **kwargs
     ):
         super().__init__(
             cases,
@@ -44,7 +45,8 @@ class SampleSplitting(IRPDBase):
             prompts_path,
             data_path,
             test_paths,
-            batch
+            batch,
+            **kwargs
         )
         self._test_type = "sample_splitting"
     
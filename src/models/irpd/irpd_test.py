@@ -33,7 +33,8 @@ class Test(IRPDBase):
         prompts_path: Optional[Union[str, Path]] = None,
         data_path: Optional[Union[str, Path]] = None,
         test_paths: Optional[List[str]] = None,
-        batch: bool = False
+        batch: bool = False,
+        **kwargs
     ):
         super().__init__(
             cases,
@@ -48,7 +49,8 @@ class Test(IRPDBase):
             prompts_path,
             data_path,
             test_paths,
-            batch
+            batch,
+            **kwargs
         )
         self.test_type = "test"
         
@@ -93,8 +95,9 @@ class Test(IRPDBase):
                 prompts_path=self.prompts_path,
                 stages=self.stages,
                 batches=self.batch_request,
-                total_replications=1
+                total_replications=1,
+                **self.test_options
             )
             self.configs[config.id] = config
-            self.outputs[config.id] = OutputManager(config)
+            self.outputs[config.id] = OutputManager(config, self.read_only)
         return None
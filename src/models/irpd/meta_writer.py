@@ -0,0 +1,101 @@
+"""
+Meta writer module.
+
+Contains the MetaWriter model.
+"""
+import atexit
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from utils import load_json_n_validate, write_json
+from models.irpd.test_outputs import TestMeta
+
+
+log = logging.getLogger(__name__)
+
+# Maximum seconds an updated TestMeta is kept in memory before it is flushed.
+META_FLUSH_INTERVAL = 5.0
+
+
+
+class MetaWriter:
+    """
+    MetaWriter model.
+    
+    Keeps TestMeta objects in memory for the whole run, & serializes their
+    updates so meta can be updated from concurrent threads w/o lost updates.
+    
+    Updated TestMeta files are flushed (written atomically, i.e., never torn)
+    on a debounce interval, on request (e.g., at stage boundaries), & at exit.
+    
+    Note: A single instance (`meta_writer`) is shared across OutputProcessers.
+    """
+    def __init__(self, interval: float = META_FLUSH_INTERVAL):
+        self.interval = interval
+        self._lock = threading.RLock()
+        self._metas: Dict[Path, TestMeta] = {}
+        self._dirty = set()
+        self._timer: Optional[threading.Timer] = None
+    
+    def load(self, meta_path: Path) -> Optional[TestMeta]:
+        """
+        Returns the TestMeta object for `meta_path` (loaded from the file if not
+        in memory). None if neither.
+        """
+        with self._lock:
+            if meta_path not in self._metas:
+                if not meta_path.exists():
+                    return None
+                self._metas[meta_path] = load_json_n_validate(meta_path, TestMeta)
+            return self._metas[meta_path]
+    
+    def update(
+        self,
+        meta_path: Path,
+        update: Callable[[TestMeta], TestMeta],
+        default: Callable[[], TestMeta],
+        flush: bool = False
+    ):
+        """
+        Updates the TestMeta object for `meta_path` w/ `update`. If it does not
+        exist, the TestMeta object is created w/ `default`.
+        
+        If flush, the file is written immediately. Otherwise, it is written
+        within the flush interval.
+        """
+        with self._lock:
+            meta = update(self.load(meta_path) or default())
+            self._metas[meta_path] = meta
+            self._dirty.add(meta_path)
+            
+            if flush:
+                self.flush(meta_path)
+            elif self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return meta
+    
+    def flush(self, meta_path: Optional[Path] = None):
+        """
+        Writes the updated TestMeta files (or only `meta_path`) atomically.
+        """
+        with self._lock:
+            paths = [meta_path] if meta_path else list(self._dirty)
+            for path in paths:
+                if path not in self._dirty:
+                    continue
+                write_json(path, self._metas[path].model_dump(), atomic=True)
+                self._dirty.discard(path)
+            
+            # Pending flush no longer needed if all files are written.
+            if not self._dirty and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return None
+
+
+meta_writer = MetaWriter()
+atexit.register(meta_writer.flush)
@@ -0,0 +1,166 @@
+"""
+Output journal module.
+
+Contains the OutputJournal model.
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Iterator
+
+from utils import json_dumps, json_loads
+from models.prompts import Prompts
+from models.request_output import RequestOut, MetaOut
+
+
+log = logging.getLogger(__name__)
+
+
+
+class OutputJournal:
+    """
+    OutputJournal model.
+    
+    An append-only (fsync'd) JSONL journal of RequestOut objects, written as
+    each request completes. Used to replay requests that were not yet stored
+    (e.g., if a test crashed mid-stage).
+    
+    System prompts are written once as a `system` record, & referenced by hash
+    in `output` records.
+    """
+    def __init__(self, journal_path: Path):
+        self.journal_path = Path(journal_path)
+        self._lock = threading.Lock()
+        self._system_hashes = set()
+    
+    @staticmethod
+    def _hash(text: str):
+        """
+        Returns the hash of a prompt.
+        """
+        return hashlib.sha256(text.encode()).hexdigest()
+    
+    def _append(self, records: List[dict], journal_path: Path = None):
+        """
+        Appends records to the journal (or `journal_path`) & fsyncs.
+        """
+        with open(journal_path or self.journal_path, "a") as f:
+            for record in records:
+                f.write(json_dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return None
+    
+    def append(
+        self,
+        stage_name: str,
+        subset: str,
+        replication: int,
+        output: RequestOut
+    ):
+        """
+        Appends a RequestOut object to the journal.
+        """
+        records = []
+        system = output.prompts.system if output.prompts else ""
+        system_hash = self._hash(system)
+        
+        with self._lock:
+            if system_hash not in self._system_hashes:
+                records.append({"type": "system", "hash": system_hash, "text": system})
+                self._system_hashes.add(system_hash)
+            
+            records.append({
+                "type": "output",
+                "stage": stage_name,
+                "subset": subset,
+                "replication": replication,
+                "system": system_hash,
+                "user": output.prompts.user if output.prompts else None,
+                "parsed": output.parsed.model_dump() if output.parsed else None,
+                "meta": {
+                    "input_tokens": output.meta.input_tokens,
+                    "output_tokens": output.meta.output_tokens,
+                    "created": output.meta.created
+                }
+            })
+            self._append(records)
+        return None
+    
+    def _records(self) -> Iterator[dict]:
+        """
+        Yields journal records. A torn (partially written) last line is
+        skipped.
+        """
+        if not self.journal_path.exists():
+            return
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json_loads(line)
+                except json.JSONDecodeError:
+                    log.warning(f"Skipped torn record in journal {self.journal_path}.")
+    
+    def replay(self, schemas: Dict[str, object]):
+        """
+        Returns a dictionary of (stage, subset, replication) to the journaled
+        RequestOut objects. Outputs are validated w/ the stage schema, &
+        records w/o a parsed output are skipped.
+        """
+        systems = {}
+        replayed: Dict[tuple, List[RequestOut]] = {}
+        for record in self._records():
+            if record["type"] == "system":
+                systems[record["hash"]] = record["text"]
+                self._system_hashes.add(record["hash"])
+                continue
+            
+            if record["parsed"] is None or record["stage"] not in schemas:
+                continue
+            
+            key = (record["stage"], record["subset"], record["replication"])
+            replayed.setdefault(key, []).append(RequestOut(
+                parsed=schemas[record["stage"]].model_validate(record["parsed"]),
+                prompts=Prompts(
+                    system=systems.get(record["system"], ""),
+                    user=record["user"]
+                ),
+                meta=MetaOut(**record["meta"])
+            ))
+        return replayed
+    
+    def compact(self, keep: set):
+        """
+        Rewrites the journal w/ only the output records of (stage, subset,
+        replication) keys in `keep` (& the system records they reference).
+        
+        The journal is replaced atomically.
+        """
+        with self._lock:
+            records = list(self._records())
+            outputs = [
+                r for r in records
+                if r["type"] == "output"
+                and (r["stage"], r["subset"], r["replication"]) in keep
+            ]
+            hashes = {r["system"] for r in outputs}
+            systems = [
+                r for r in records if r["type"] == "system" and r["hash"] in hashes
+            ]
+            
+            if not outputs:
+                self.journal_path.unlink(missing_ok=True)
+                self._system_hashes = set()
+                return None
+            
+            tmp_path = self.journal_path.with_suffix(".tmp")
+            tmp_path.unlink(missing_ok=True)
+            self._append(systems + outputs, tmp_path)
+            os.replace(tmp_path, self.journal_path)
+            self._system_hashes = hashes
+        return None
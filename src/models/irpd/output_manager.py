@@ -4,21 +4,38 @@ Output manager module.
 Contains the functional OutputManager model.
 """
 import logging
+import threading
+from datetime import datetime
 from pathlib import Path
+from collections import OrderedDict
 from time import sleep
 from typing import List, Dict, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
 
-from utils import check_directories, load_json_n_validate, lazy_import, to_list
+from utils import (
+    check_directories, load_json, validate_json_string,
+    lazy_import, to_list, content_hash, flush_writes
+)
+from tools.functions import output_attrb, category_id, category_id_map
 from models.batch_output import BatchOut
-from models.request_output import RequestOut
-from models.irpd.output_processer import OutputProcesser
+from models.request_output import RequestOut, MetaOut
+from models.irpd.output_processer import OutputProcesser, MANIFEST_FILE
 from models.irpd.test_config import TestConfig
 from models.irpd.config_manager import ConfigManager
-from models.irpd.test_outputs import TestOutput, StageOutput, TestMeta
+from models.irpd.schemas import classification_schema
+from models.irpd.output_journal import OutputJournal
+from models.irpd.meta_writer import meta_writer
+from models.irpd.artifact_worker import artifact_worker
+from models.irpd.packed_store import PackedStore
+from models.irpd.test_outputs import TestOutput, StageOutput, TestMeta, ModelInfo
 
 
 log = logging.getLogger(__name__)
 
+# Journal subset suffix of stage 1 shard outputs (journaled under the subset 
+# of the shards' StageOutput).
+SHARD_SUFFIX = "#shard"
+
 
 
 class OutputManager:
@@ -33,10 +50,16 @@ class OutputManager:
     
     Also contains method `write_output` that creates instance of the 
     OutputProcessor model to write a subset of outputs.
+    
+    If read only (e.g., for `IRPDBase.plan`), the test path is not written to
+    on initialization (no manifests written, journals compacted, or dirs. 
+    created), & batches are not checked (i.e., stages w/ a pending batch are
+    incomplete). Outputs must not be stored.
     """
-    def __init__(self, test_config: TestConfig):
-        self.config_manager = ConfigManager(test_config)
+    def __init__(self, test_config: TestConfig, read_only: bool = False):
+        self.config_manager = ConfigManager(test_config, read_only)
         self.test_config = test_config
+        self.read_only = read_only
         self.processor = OutputProcesser
         self.test_path = test_config.test_path
         self.total_replications = test_config.total_replications
@@ -47,14 +70,47 @@ class OutputManager:
             stage: lazy_import("models.irpd.schemas", f"Stage{stage}Schema")
             for stage in self.stages
         }
+        
+        # Stage 2 & 3 outputs w/o reasoning (fast mode) use a run time schema.
+        if not test_config.reasoning:
+            self.schemas.update({
+                stage: classification_schema(stage, reasoning=False)
+                for stage in self.stages if stage in {"2", "3"}
+            })
+        self._request_schemas = {}
+        
+        # Stores are serialized per LLM & replication (i.e., per subpath), as
+        # outputs can be stored from concurrent threads (e.g., TestScheduler).
+        self._locks = {
+            (llm_str, n): threading.RLock()
+            for llm_str in self.llms
+            for n in range(1, self.total_replications + 1)
+        }
         self.generate_llm_instance = self.config_manager.generate_llm_instance
         
+        # OutputProcesser objects are reused for each subpath (LLM & 
+        # replication), w/ the ModelInfo resolved once per LLM.
+        self.processors: Dict[tuple, OutputProcesser] = {}
+        self._model_infos: Dict[str, ModelInfo] = {}
+        
         self.test_outputs = self._initialize_test_outputs()
+        self._index = self._index_test_outputs()
+        self.journals: Dict[tuple, OutputJournal] = {}
         
-        # Checking current test path (and batch) for outputs on initialization.
+        # Replayed stage 1 shard outputs, keyed by (llm, replication, subset).
+        self._shard_outputs: Dict[tuple, List[RequestOut]] = {}
+        
+        # LRU of complete stages (llm, replication, stage) in memory (see 
+        # `hot_stages` test option).
+        self._hot_stages: OrderedDict = OrderedDict()
+        self._hot_lock = threading.Lock()
+        
+        # Checking current test path (journals and batch) for outputs on 
+        # initialization.
         self._check_test_directory()
+        self._replay_journals()
         self._check_batch()
-        
+    
     def _initialize_test_outputs(self):
         """
         Initializes TestOutput and StageOutput objects.
@@ -81,10 +137,35 @@ class OutputManager:
             test_outputs[llm_str] = test_output
         return test_outputs
     
+    def _index_test_outputs(self):
+        """
+        Returns the index of StageOutput objects, keyed by (llm, replication, 
+        stage, subset). Each StageOutput is also indexed under each partial key
+        (w/ None for unspecified fields) used by `retrieve` method.
+        
+        Note: StageOutput objects are only created on initialization, & are 
+        otherwise updated in place.
+        """
+        index: Dict[tuple, List[StageOutput]] = {}
+        for llm_str, test_output in self.test_outputs.items():
+            for stage_output in test_output.stage_outputs:
+                for n in (stage_output.replication, None):
+                    for stage_name in (stage_output.stage_name, None):
+                        for subset in (stage_output.subset, None):
+                            key = (llm_str, n, stage_name, subset)
+                            index.setdefault(key, []).append(stage_output)
+        return index
+    
     def _check_test_directory(self):
         """
         Checks each possible subpath of a TestConfig for outputs.
         
+        Subsets w/ a manifest are marked complete, & their outputs are only 
+        loaded when retrieved (see `verify` method to validate all responses).
+        Subsets w/o a manifest (i.e., written before manifests) are loaded, 
+        validated, & have their manifest written, unless the replication has
+        a journal (i.e., the subset may be partial).
+        
         Note: This method is run before `_check_batch` method.
         """
         for llm_str, test_output in self.test_outputs.items():
@@ -93,33 +174,383 @@ class OutputManager:
                 stage_name = stage_output.stage_name
                 subset = stage_output.subset
                 
-                sub_path = self.config_manager.generate_subpath(
-                    stage_output.replication, stage_output.llm_str
+                subset_path = self.config_manager.generate_subset_path(
+                    stage_output.replication, stage_output.llm_str, stage_name, subset
                 )
-                stage_string = f"stage_{stage_name}"
-                responses_path = sub_path / stage_string / subset / "responses"
-                prompts_path = sub_path / stage_string / subset / "prompts"
+                responses_path = subset_path / "responses"
+                prompts_path = subset_path / "prompts"
                 
-                # If prompts & responses directories don't exist, there are no
-                # outputs to store.
-                if not check_directories([responses_path, prompts_path]):
+                # If prompts & responses directories (or a packed store) don't
+                # exist, there are no outputs to store.
+                packed = PackedStore.exists(subset_path)
+                if not (packed or check_directories([responses_path, prompts_path])):
                     continue
                 
-                outputs = [
-                    RequestOut(parsed=load_json_n_validate(path, self.schemas[stage_name]))
-                    for path in responses_path.iterdir()
-                ]
+                if (subset_path / MANIFEST_FILE).exists():
+                    stage_output.complete = True
+                    stage_output.deferred = True
+                    continue
+                
+                # W/ a journal for the replication, the subset was written 
+                # since journaling (i.e., a run stopped before its manifest 
+                # was written), so may be partial. It is left incomplete & 
+                # its outputs are replayed from the journal.
+                journal_path = self.config_manager.generate_journal_path(
+                    stage_output.replication, stage_output.llm_str
+                )
+                if journal_path.exists():
+                    continue
                 
+                responses = self._read_responses(subset_path)
+                outputs = self._restore_outputs(
+                    [
+                        validate_json_string(text, self.schemas[stage_name])
+                        for text in responses.values()
+                    ],
+                    self._meta_totals(stage_output)
+                )
+                
+                # Outputs in the directory are already written.
+                stage_output.complete = True
+                if self.read_only:
+                    stage_output.outputs = outputs
+                    continue
                 self.store_completion(stage_output, outputs)
+                self.processor.write_manifest(stage_output, subset_path, {
+                    name: content_hash(text) for name, text in responses.items()
+                })
+            
+            # Checking if TestOutput object is complete.
+            test_output.check_test_complete()
+        return None
+    
+    @staticmethod
+    def _restore_outputs(parsed: list, totals: dict) -> List[RequestOut]:
+        """
+        Returns the RequestOut objects of the parsed responses of a subset, w/ 
+        the created time & token totals of its manifest (or meta). Per output 
+        tokens are not written, so the totals are carried by the first output.
+        """
+        created = totals.get("created")
+        outputs = [
+            RequestOut(parsed=response, meta=MetaOut(0, 0, created=created))
+            for response in parsed
+        ]
+        if outputs:
+            outputs[0].meta = MetaOut(
+                totals.get("input_tokens", 0),
+                totals.get("output_tokens", 0),
+                created=created
+            )
+        return outputs
+    
+    @staticmethod
+    def _load_manifest(manifest_path: Path) -> dict:
+        """
+        Returns the manifest of a subset dir. Manifests written w/o the created 
+        time use the time the manifest was written.
+        """
+        manifest = load_json(manifest_path)
+        if not manifest.get("created"):
+            manifest["created"] = int(manifest_path.stat().st_mtime)
+        return manifest
+    
+    def _meta_totals(self, stage_output: StageOutput) -> dict:
+        """
+        Returns the created time & token totals of a subset from the TestMeta 
+        (i.e., for subsets written before manifests). Empty if not in the meta.
+        """
+        meta: TestMeta = meta_writer.load(self.config_manager.generate_meta_path(
+            stage_output.replication, stage_output.llm_str
+        ))
+        stage_info = meta.stages.get(stage_output.stage_name) if meta else None
+        subset_info = stage_info.subsets.get(stage_output.subset) if stage_info else None
+        if not subset_info:
+            return {}
+        created = subset_info.created
+        return {
+            "created": int(datetime.fromisoformat(created).timestamp()) if created else None,
+            "input_tokens": subset_info.input_tokens,
+            "output_tokens": subset_info.output_tokens
+        }
+    
+    @staticmethod
+    def _read_responses(subset_path: Path) -> Dict[str, str]:
+        """
+        Returns the responses of a subset dir. (from the packed store, or the
+        response files), keyed by the response file name.
+        """
+        if PackedStore.exists(subset_path):
+            return PackedStore(subset_path).responses()
+        return {
+            path.name: path.read_text()
+            for path in sorted((subset_path / "responses").iterdir())
+        }
+    
+    @staticmethod
+    def _read_response(subset_path: Path, name: str) -> Optional[str]:
+        """
+        Returns a response of a subset dir. by its file name. None if missing.
+        """
+        if PackedStore.exists(subset_path):
+            return PackedStore(subset_path).response(name)
+        path = subset_path / "responses" / name
+        return path.read_text() if path.exists() else None
+    
+    def load_outputs(self, stage_outputs: Union[StageOutput, List[StageOutput]]):
+        """
+        Loads the outputs of deferred StageOutput objects (i.e., complete 
+        outputs found w/ a manifest on initialization).
+        """
+        for stage_output in to_list(stage_outputs):
+            with self._lock(stage_output.llm_str, stage_output.replication):
+                if not stage_output.deferred:
+                    continue
+                subset_path = self.config_manager.generate_subset_path(
+                    stage_output.replication,
+                    stage_output.llm_str,
+                    stage_output.stage_name,
+                    stage_output.subset
+                )
+                schema = self.schemas[stage_output.stage_name]
+                stage_output.outputs = self._restore_outputs(
+                    [
+                        validate_json_string(text, schema)
+                        for text in self._read_responses(subset_path).values()
+                    ],
+                    self._load_manifest(subset_path / MANIFEST_FILE)
+                )
+                stage_output.deferred = False
+        self._touch_stages(stage_outputs)
+        return None
+    
+    def _touch_stages(self, stage_outputs: Union[StageOutput, List[StageOutput]]):
+        """
+        Marks the stages of complete StageOutput objects as most recently used,
+        & evicts the least recently used stages over the `hot_stages` limit.
+        """
+        if not self.test_config.hot_stages:
+            return None
+        with self._hot_lock:
+            for stage_output in to_list(stage_outputs):
+                if stage_output.complete and not stage_output.deferred:
+                    key = (stage_output.llm_str, stage_output.replication, stage_output.stage_name)
+                    self._hot_stages[key] = True
+                    self._hot_stages.move_to_end(key)
+            evict = []
+            while len(self._hot_stages) > self.test_config.hot_stages:
+                evict.append(self._hot_stages.popitem(last=False)[0])
+        
+        if evict:
+            # Written outputs are on disk before evicted.
+            flush_writes()
+        for key in evict:
+            self._evict_stage(*key)
+        return None
+    
+    def _evict_stage(self, llm_str: str, n: int, stage_name: str):
+        """
+        Evicts the outputs of a complete stage (w/ manifests) to disk. The 
+        StageOutput objects are deferred, so are reloaded when retrieved.
+        
+        Note: If the subpath is locked by another thread (e.g., storing, or 
+        reading w/ `read_outputs`), the stage is kept as the least recently 
+        used. The outputs list of an evicted StageOutput is replaced (i.e., 
+        not cleared in place), so lists already read stay valid.
+        """
+        lock = self._lock(llm_str, n)
+        if not lock.acquire(blocking=False):
+            with self._hot_lock:
+                self._hot_stages[(llm_str, n, stage_name)] = True
+                self._hot_stages.move_to_end((llm_str, n, stage_name), last=False)
+            return None
+        try:
+            for stage_output in self.retrieve(llm_str, n, stage_name, load=False):
+                subset_path = self.config_manager.generate_subset_path(
+                    n, llm_str, stage_name, stage_output.subset
+                )
+                if stage_output.complete and (subset_path / MANIFEST_FILE).exists():
+                    stage_output.outputs = []
+                    stage_output.deferred = True
+        finally:
+            lock.release()
+        return None
+    
+    def _verify_response(
+        self,
+        subset_path: Path,
+        name: str,
+        expected_hash: str,
+        schema: object
+    ):
+        """
+        Returns the validated response of a response file, or None if the file
+        is missing, its content hash differs from the manifest, or is invalid.
+        """
+        text = self._read_response(subset_path, name)
+        if text is None or content_hash(text) != expected_hash:
+            return None
+        return validate_json_string(text, schema)
+    
+    def verify(self, max_workers: Optional[int] = None):
+        """
+        Verifies all written outputs against their manifests (in parallel). 
+        Each response file is checked for its content hash & validated w/ the
+        stage schema.
+        
+        StageOutput objects w/ missing, modified, or invalid responses keep 
+        their valid responses, but are marked incomplete (i.e., the remaining
+        responses are requested in the next run). Returns the list of invalid 
+        response paths.
+        """
+        flush_writes()
+        tasks, manifests = [], {}
+        for llm_str, test_output in self.test_outputs.items():
+            for stage_output in test_output.stage_outputs:
+                subset_path = self.config_manager.generate_subset_path(
+                    stage_output.replication, llm_str, stage_output.stage_name,
+                    stage_output.subset
+                )
+                manifest_path = subset_path / MANIFEST_FILE
+                if not manifest_path.exists():
+                    continue
+                manifests[id(stage_output)] = self._load_manifest(manifest_path)
+                tasks += [
+                    (stage_output, subset_path, name, expected)
+                    for name, expected in manifests[id(stage_output)]["hashes"].items()
+                ]
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            parsed = list(executor.map(
+                lambda task: self._verify_response(
+                    task[1], task[2], task[3], self.schemas[task[0].stage_name]
+                ),
+                tasks
+            ))
+        
+        # Grouping the verified responses by StageOutput.
+        stage_outputs: Dict[int, StageOutput] = {}
+        verified: Dict[int, list] = {}
+        invalid, invalid_ids = [], set()
+        for (stage_output, subset_path, name, _), response in zip(tasks, parsed):
+            stage_outputs[id(stage_output)] = stage_output
+            responses = verified.setdefault(id(stage_output), [])
+            if response is None:
+                invalid.append(subset_path / "responses" / name)
+                invalid_ids.add(id(stage_output))
+                continue
+            responses.append(response)
+        
+        # The manifest totals are kept (so are not lost when the subset is 
+        # resumed & rewritten).
+        for key, stage_output in stage_outputs.items():
+            with self._lock(stage_output.llm_str, stage_output.replication):
+                stage_output.outputs = self._restore_outputs(verified[key], manifests[key])
+                stage_output.complete = key not in invalid_ids
+                stage_output.deferred = False
+        for test_output in self.test_outputs.values():
+            test_output.check_test_complete()
+        
+        log.info(
+            f"\nVerified {len(tasks)} responses for:"
+            f"\n\t config: {self.test_config.id}"
+            f"\n\t case: {self.test_config.case}"
+            f"\n\t invalid: {len(invalid)}"
+        )
+        return invalid
+    
+    def _lock(self, llm_str: str, n: int):
+        """
+        Returns the lock for a given LLM and replication.
+        """
+        return self._locks[(llm_str, n)]
+    
+    def get_processor(self, llm_str: str, n: int):
+        """
+        Returns the OutputProcesser for a given LLM and replication.
+        """
+        key = (llm_str, n)
+        with self._lock(llm_str, n):
+            if key not in self.processors:
+                if llm_str not in self._model_infos:
+                    self._model_infos[llm_str] = self.config_manager.generate_model_info(llm_str)
+                self.processors[key] = self.processor(
+                    self.config_manager, llm_str, n, self._model_infos[llm_str]
+                )
+        return self.processors[key]
+    
+    def _journal(self, llm_str: str, n: int):
+        """
+        Returns the OutputJournal for a given LLM and replication.
+        """
+        key = (llm_str, n)
+        with self._lock(llm_str, n):
+            if key not in self.journals:
+                self.journals[key] = OutputJournal(
+                    self.config_manager.generate_journal_path(n, llm_str)
+                )
+        return self.journals[key]
+    
+    def _replay_journals(self):
+        """
+        Replays the output journal of each subpath, adding the journaled 
+        outputs to incomplete StageOutput objects. Journals are then compacted
+        to only the outputs of incomplete StageOutputs.
+        
+        Note: This method is run after `_check_test_directory` method.
+        """
+        for llm_str, test_output in self.test_outputs.items():
+            replications = sorted({
+                output.replication for output in test_output.stage_outputs
+            })
+            for n in replications:
+                journal = self._journal(llm_str, n)
+                replayed = journal.replay(self.schemas)
                 
-                # Checking if TestOutput object is complete.
-                test_output.check_test_complete()
+                incomplete = set()
+                for stage_output in self.retrieve(llm_str, n, load=False):
+                    if stage_output.complete:
+                        continue
+                    key = (stage_output.stage_name, stage_output.subset, n)
+                    incomplete.add(key)
+                    
+                    # Shard outputs of incomplete stage 1 subsets are kept, 
+                    # so finished shards are not re-requested.
+                    if stage_output.stage_name == "1":
+                        shard_key = ("1", f"{stage_output.subset}{SHARD_SUFFIX}", n)
+                        incomplete.add(shard_key)
+                        if shard_key in replayed:
+                            self._shard_outputs[(llm_str, n, stage_output.subset)] = replayed[shard_key]
+                    if key not in replayed:
+                        continue
+                    
+                    # Iterative stages are de-duplicated by window number. 
+                    # Otherwise, the latest journaled output is used.
+                    if stage_output.stage_name in {"2", "3"}:
+                        outputs = {
+                            output.parsed.window_number: output
+                            for output in stage_output.outputs + replayed[key]
+                        }
+                        stage_output.outputs = list(outputs.values())
+                    else:
+                        stage_output.outputs = replayed[key][-1:]
+                    
+                    log.info(
+                        f"Replayed {len(replayed[key])} journaled outputs for"
+                        f" llm {llm_str}, replication {n}, stage"
+                        f" {stage_output.stage_name}, subset {stage_output.subset}."
+                    )
+                if not self.read_only:
+                    journal.compact(incomplete)
         return None
     
     def _check_batch(self):
         """
-        Checks the Batch status if outputs don't exist in directory.
+        Checks the Batch status if outputs don't exist in directory. Not 
+        checked if read only.
         """
+        if self.read_only:
+            return None
         for llm_str, test_output in self.test_outputs.items():
             test_output: TestOutput
             
@@ -127,11 +558,11 @@ class OutputManager:
             # Note: If output found in directory, object should be marked as 
             # complete.
             if not test_output.complete:
-                meta_path = self.config_manager.generate_meta_path(llm_str, 1)
+                meta_path = self.config_manager.generate_meta_path(1, llm_str)
                 
-                # Checking to see if meta path exists & Test include batches.
-                if self.test_config.batches and meta_path.exists():
-                    meta: TestMeta = load_json_n_validate(meta_path, TestMeta)
+                # Checking to see if meta exists & Test include batches.
+                meta: TestMeta = meta_writer.load(meta_path)
+                if self.test_config.batches and meta:
                     
                     # Initializing LLM to check batches (if exist).
                     llm = self.generate_llm_instance(llm_str)
@@ -157,7 +588,7 @@ class OutputManager:
                         
                         # Checking batch status.
                         batch_path = Path(batch_path)
-                        schema = self.schemas[stage_name]
+                        schema = self.get_schema(llm_str, stage_name)
                         batch_out = llm.retreive_batch(
                             batch_id, schema, batch_path
                         )
@@ -180,18 +611,22 @@ class OutputManager:
                     self.test_outputs[llm_str] = test_output
         return None
     
-    def _get_output_index(self, stage_output: StageOutput):
-        """
-        Returns the index of a given StageOutput object within TestOutput object.
-        """
-        return self.test_outputs[stage_output.llm_str].stage_outputs.index(stage_output)
-    
-    def _check_stage_completion(self, llm_str: str, stage_name: str, n: int):
+    def _map_category_ids(
+        self,
+        stage_output: StageOutput,
+        outputs: List[RequestOut]
+    ):
         """
-        Checks whether a stage is complete.
+        Maps the category IDs of Stage 2 & 3 outputs back to category names, 
+        if the test uses category IDs.
         """
-        all_stage_ouptuts = self.retrieve(llm_str, n, stage_name)
-        return all(output.complete for output in all_stage_ouptuts)
+        if not (self.test_config.category_ids and stage_output.stage_name in {"2", "3"}):
+            return outputs
+        
+        categories = self.get_categories(stage_output.llm_str, stage_output.replication)
+        return self.processor.map_category_ids(
+            outputs, category_id_map(categories), self.schemas[stage_output.stage_name]
+        )
     
     def _log_stored_completion(self, stage_output: StageOutput):
         """
@@ -214,20 +649,19 @@ class OutputManager:
         llm_str: Optional[str] = None,
         n: Optional[int] = None,
         stage_name: Optional[str] = None,
-        subset: Optional[str] = None
+        subset: Optional[str] = None,
+        load: bool = True
     ):
         """
-        Retrieves output(s).
+        Retrieves output(s). If load, the outputs of deferred StageOutput 
+        objects are loaded.
         """
         outputs: Dict[str, TestOutput] = self.test_outputs
         if llm_str:
-            outputs: List[StageOutput] = outputs[llm_str].stage_outputs
-            if n is not None:
-                outputs: List[StageOutput] = list(filter(lambda output: output.replication == n, outputs))
-            if stage_name:
-                outputs: List[StageOutput] = list(filter(lambda output: output.stage_name == stage_name, outputs))
-            if subset:
-                outputs: StageOutput = list(filter(lambda output: output.subset == subset, outputs))
+            key = (llm_str, n, stage_name or None, subset or None)
+            outputs: List[StageOutput] = list(self._index.get(key, []))
+            if load:
+                self.load_outputs(outputs)
         if outputs is None:
             log.warning(
                 "\nOutputs not found for:"
@@ -241,6 +675,82 @@ class OutputManager:
             return None
         return to_list(outputs)
     
+    def read_outputs(
+        self,
+        llm_str: str,
+        n: int,
+        stage_name: str,
+        subset: Optional[str] = None
+    ) -> List[List[RequestOut]]:
+        """
+        Returns the outputs of the StageOutput objects for a given LLM, 
+        replication, & stage (& subset), loaded if deferred.
+        
+        The outputs are loaded & read under the subpath lock, so the stage 
+        cannot be evicted by another thread in between (see `_evict_stage`).
+        Use this method, rather than `retrieve`, to read the outputs of other
+        (possibly complete) stages.
+        """
+        with self._lock(llm_str, n):
+            return [
+                stage_output.outputs
+                for stage_output in self.retrieve(llm_str, n, stage_name, subset)
+            ]
+    
+    def get_categories(self, llm_str: str, n: int):
+        """
+        Returns the categories used in the classification stages (2 & 3).
+        
+        Almost always will be the Stage 1c categories, but if skipped, is all 
+        stage 1r subset categories.
+        """
+        if "1c" in self.stages:
+            context = self.read_outputs(llm_str, n, "1c", "full")
+        else:
+            context = self.read_outputs(llm_str, n, "1r")
+        
+        categories = []
+        for outputs in context:
+            if outputs:
+                categories += output_attrb(outputs[0].parsed)
+        return categories
+    
+    def get_schema(
+        self,
+        llm_str: str,
+        stage_name: str,
+        n: Optional[int] = None
+    ):
+        """
+        Returns the request (structured output) schema for a given stage.
+        
+        If the test uses category IDs, the Stage 2 & 3 schemas are generated at
+        run time w/ an enum of the category IDs. If `n` is not specified (e.g., 
+        for batches), the IDs span all replications.
+        """
+        if not (self.test_config.category_ids and stage_name in {"2", "3"}):
+            return self.schemas[stage_name]
+        
+        replications = [n] if n is not None else range(1, self.total_replications + 1)
+        total_ids = max(len(self.get_categories(llm_str, r)) for r in replications)
+        if not total_ids:
+            log.warning(
+                f"No categories found for stage {stage_name} category IDs. Using"
+                " the category name schema."
+            )
+            return self.schemas[stage_name]
+        
+        # Category IDs are positional, so schemas only differ by the number 
+        # of categories.
+        key = (stage_name, total_ids)
+        if key not in self._request_schemas:
+            self._request_schemas[key] = classification_schema(
+                stage_name,
+                category_ids=[category_id(i) for i in range(1, total_ids + 1)],
+                reasoning=self.test_config.reasoning
+            )
+        return self._request_schemas[key]
+    
     def store_completion(
         self,
         stage_output: StageOutput,
@@ -249,20 +759,18 @@ class OutputManager:
         """
         Stores a chat completion request.
         """
+        assert not self.read_only, "Outputs cannot be stored if read only."
         llm_str = stage_output.llm_str
         n = stage_output.replication
         stage_name = stage_output.stage_name
         subset = stage_output.subset
         
-        output: TestOutput = self.retrieve(llm_str, n, stage_name, subset)[0]
-        idx = self._get_output_index(output)
-        
-        output.outputs = to_list(outputs)
-        output.complete = True
-        self.test_outputs[stage_output.llm_str].stage_outputs[idx] = output
-        
-        # Writing output
-        self.write_output(output)
+        with self._lock(llm_str, n):
+            output: StageOutput = self.retrieve(llm_str, n, stage_name, subset, load=False)[0]
+            output.outputs = self._map_category_ids(output, to_list(outputs))
+            
+            # Writing output (also marks output complete).
+            self.write_output(output)
         
         self._log_stored_completion(output)
         return None
@@ -277,51 +785,152 @@ class OutputManager:
         """
         Stores a batch request.
         """
+        assert not self.read_only, "Outputs cannot be stored if read only."
         outputs = batch_out.responses
         stage_outputs: List[StageOutput] = self.retrieve(
             llm_str=llm_str,
-            stage_name=stage_name
+            stage_name=stage_name,
+            load=False
         )
         for stage_output in stage_outputs:
-            idx = self._get_output_index(stage_output)
             n  = stage_output.replication
             subset = stage_output.subset
-            
-            # Storing batch outputs in StageOutput object if batch request ID
-            # matches the StageOutput attrbs.
-            stage_output.outputs = [
-                response.response for response in outputs
-                if response.response_id.startswith(f"{n}-{subset}")
-            ]
-            stage_output.complete = True
-            
-            # Storing batch id and batch path if one or both are not stored.
-            if not (stage_output.batch_id or stage_output.batch_path):
-                stage_output.batch_id = batch_out.batch_id
-                stage_output.batch_path = batch_file_path
-            
-            self.test_outputs[llm_str].stage_outputs[idx] = stage_output
-            
-            # Writing output
-            self.write_output(stage_output)
-
-            self._log_stored_completion(stage_output)
+            with self._lock(llm_str, n):
+                # Storing batch outputs in StageOutput object if batch request ID
+                # matches the StageOutput attrbs.
+                stage_output.outputs = self._map_category_ids(stage_output, [
+                    response.response for response in outputs
+                    if response.response_id.startswith(f"{n}-{subset}")
+                ])
+                
+                # Storing batch id and batch path if one or both are not stored.
+                if not (stage_output.batch_id or stage_output.batch_path):
+                    stage_output.batch_id = batch_out.batch_id
+                    stage_output.batch_path = batch_file_path
+                
+                # Writing output (also marks output complete).
+                self.write_output(stage_output)
+                
+                self._log_stored_completion(stage_output)
         return None
     
-    def write_output(self, stage_output: StageOutput):
+    def export(self):
+        """
+        Submits the final form outputs of all complete stages (for each LLM &
+        replication), & waits for them to be built.
+        """
+        for llm_str, test_output in self.test_outputs.items():
+            replications = sorted({
+                output.replication for output in test_output.stage_outputs
+            })
+            for n in replications:
+                for stage_name in self.stages:
+                    with self._lock(llm_str, n):
+                        stage_outputs = self.retrieve(llm_str, n, stage_name, load=False)
+                        if not all(output.complete for output in stage_outputs):
+                            continue
+                        self.load_outputs(stage_outputs)
+                        self.get_processor(llm_str, n).submit_final(stage_outputs)
+        artifact_worker.wait()
+        return None
+    
+    def export_legacy_layout(self):
+        """
+        Exports the subset dirs. of the test to the legacy layout (i.e., packed
+        stores & prompt blobs to prompts & responses files). Returns the 
+        exported subset dirs.
+        """
+        flush_writes()
+        subset_paths = []
+        stage_outputs = [
+            stage_output for llm_str in self.test_outputs
+            for stage_output in self.retrieve(llm_str, load=False)
+        ]
+        for stage_output in stage_outputs:
+            subset_path = self.config_manager.generate_subset_path(
+                stage_output.replication,
+                stage_output.llm_str,
+                stage_output.stage_name,
+                stage_output.subset
+            )
+            if not (subset_path / MANIFEST_FILE).exists():
+                continue
+            processor = self.get_processor(stage_output.llm_str, stage_output.replication)
+            processor.export_legacy_layout(subset_path)
+            subset_paths.append(subset_path)
+        return subset_paths
+    
+    def journal_output(self, stage_output: StageOutput, output: RequestOut):
+        """
+        Appends a RequestOut object to the output journal, before the 
+        StageOutput is stored. Stage 2 & 3 outputs are also appended to the 
+        stage ResultTable.
+        """
+        assert not self.read_only, "Outputs cannot be journaled if read only."
+        llm_str = stage_output.llm_str
+        n = stage_output.replication
+        stage_name = stage_output.stage_name
+        
+        output = self._map_category_ids(stage_output, to_list(output))[0]
+        self._journal(llm_str, n).append(stage_name, stage_output.subset, n, output)
+        if stage_name in {"2", "3"}:
+            self.get_processor(llm_str, n).append_results(stage_name, [output])
+        return None
+    
+    def journal_shard(self, stage_output: StageOutput, output: RequestOut):
+        """
+        Appends a stage 1 shard RequestOut object to the output journal (under 
+        the shard subset of the StageOutput).
+        """
+        self._journal(stage_output.llm_str, stage_output.replication).append(
+            "1", f"{stage_output.subset}{SHARD_SUFFIX}", stage_output.replication, output
+        )
+        return None
+    
+    def get_shard_outputs(self, stage_output: StageOutput) -> List[RequestOut]:
         """
-        Writes output
+        Returns the shard outputs of a stage 1 StageOutput object replayed from
+        the output journal.
+        """
+        key = (stage_output.llm_str, stage_output.replication, stage_output.subset)
+        return self._shard_outputs.get(key, [])
+    
+    def write_output(self, stage_output: StageOutput):
         """
-        self.processor(to_list(stage_output), self.config_manager).process()
+        Writes output & marks the StageOutput complete.
         
+        Note: Outputs already marked complete are not rewritten.
+        """
         llm_str = stage_output.llm_str
         stage_name = stage_output.stage_name
         n = stage_output.replication
         
-        # Checking to see if stage is complete. If so, writing the final form
-        # outputs (e.g., category pdfs & classification CSVs).
-        stage_complete = self._check_stage_completion(llm_str, stage_name, n)
+        with self._lock(llm_str, n):
+            # Checking to see if stage is complete w/ this output. If so, the
+            # outputs are written w/ the final form outputs (e.g., category 
+            # pdfs & classification CSVs) of all stage outputs.
+            all_stage_ouptuts = self.retrieve(llm_str, n, stage_name, load=False)
+            stage_complete = all(
+                output.complete or output is stage_output
+                for output in all_stage_ouptuts
+            )
+            processor = self.get_processor(llm_str, n)
+            if stage_complete:
+                self.load_outputs(all_stage_ouptuts)
+                processor.process(all_stage_ouptuts, stage_complete=True)
+                
+                # Stage end barrier for the background writes.
+                flush_writes()
+            else:
+                processor.process(to_list(stage_output))
+            stage_output.complete = True
+            
+            # Written prompts are not kept in memory if parsed only.
+            if self.test_config.parsed_only:
+                for output in all_stage_ouptuts if stage_complete else [stage_output]:
+                    for request_out in output.outputs:
+                        request_out.drop_prompts()
+        
         if stage_complete:
-            all_stage_ouptuts = self.retrieve(llm_str, n, stage_name)
-            self.processor(to_list(all_stage_ouptuts), self.config_manager).process(True)
+            self._touch_stages(all_stage_ouptuts)
         return None
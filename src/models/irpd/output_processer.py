@@ -4,27 +4,43 @@ Output processing module.
 Contains the OutputProcessor model.
 """
 import logging
-import json
 import pandas as pd
 from pathlib import Path
-from typing import List
+from typing import List, Dict, Optional
 from datetime import datetime
+from pydantic import BaseModel
 
-from utils import txt_to_pdf, load_json_n_validate, write_json, write_file, create_directory
+from utils import (
+    validate_json, load_json, write_json, write_file, create_directory, 
+    content_hash, to_list, json_dumps, flush_writes
+)
 from tools.functions import categories_to_txt, output_attrb
+from models.request_output import RequestOut
 from models.irpd.test_outputs import StageOutput, ModelInfo, StageInfo, SubsetInfo, TestMeta
 from models.irpd.config_manager import ConfigManager
+from models.irpd.meta_writer import meta_writer
+from models.irpd.artifact_worker import artifact_worker
+from models.irpd.result_table import ResultTable
+from models.irpd.packed_store import PackedStore
+from models.irpd.blob_store import BlobStore
+from models.irpd.data_store import data_store
 
 
 log = logging.getLogger(__name__)
 
+# Manifest file written in each stage subset dir.
+MANIFEST_FILE = "_manifest.json"
+
 
 
 class OutputProcesser:
     """
     OutputProcessor model.
     
-    Takes a list of StageOutput objects and writes outputs and meta data.
+    Writes outputs and meta data for a list of StageOutput objects (of one 
+    stage), for a given subpath (LLM & replication). An instance is reused 
+    across stores for its subpath, & takes the resolved ModelInfo (i.e., no 
+    LLM client is built).
     
     Also handles the final form outputs:
         - Stage 0 summary CSV (not complete).
@@ -33,33 +49,146 @@ class OutputProcesser:
     """
     def __init__(
         self,
-        stage_outputs: List[StageOutput],
-        config_manager: ConfigManager
+        config_manager: ConfigManager,
+        llm_str: str,
+        replication: int,
+        model_info: ModelInfo
     ):
-        self.outputs = stage_outputs
         self.config_manager = config_manager
         self.test_config = config_manager.config
-        self.stage_name = stage_outputs[0].stage_name
         self.stages = config_manager.stages
         self.total_replications = config_manager.total_replications
-        self.replication = stage_outputs[0].replication
-        self.llm_str = stage_outputs[0].llm_str
+        self.replication = replication
+        self.llm_str = llm_str
+        self.model_info = model_info
         self.sub_path = config_manager.generate_subpath(self.replication, self.llm_str)
         self.meta_path = config_manager.generate_meta_path(self.replication, self.llm_str)
-        self.stage_path = self.sub_path / f"stage_{self.stage_name}"
         self.cases = config_manager.config.cases
         self.treatment = config_manager.config.treatment
         self.ra = config_manager.config.ra
         self.data_path = config_manager.config.data_path
-        self.llm_instance = config_manager.generate_llm_instance(self.llm_str)
-        self.batch_id = stage_outputs[0].batch_id
-        self.batch_path = stage_outputs[0].batch_path
+        
+        self._result_tables: Dict[str, ResultTable] = {}
+        self.blobs = BlobStore(config_manager.generate_blobs_path())
+        
+        # StageOutput specific attrbs. (set for each process).
+        self.outputs: List[StageOutput] = []
+        self.stage_name = None
+        self.stage_path = None
+        self.batch_id = None
+        self.batch_path = None
     
-    def _build_categories_pdf(self):
+    def _set_outputs(self, stage_outputs: List[StageOutput]):
+        """
+        Sets the StageOutput objects (of one stage) to process.
         """
-        Builds the final form Category PDF files for Stage 1, 1r, & 1c.
+        self.outputs = to_list(stage_outputs)
+        self.stage_name = self.outputs[0].stage_name
+        self.stage_path = self.sub_path / f"stage_{self.stage_name}"
+        self.batch_id = self.outputs[0].batch_id
+        self.batch_path = self.outputs[0].batch_path
+        return None
+    
+    @staticmethod
+    def map_category_ids(
+        outputs: List[RequestOut],
+        id_map: Dict[str, str],
+        schema: BaseModel
+    ):
+        """
+        Maps the category IDs of Stage 2 & 3 outputs back to category names.
         
-        Saves PDF to subpath.
+        The `parsed` field of each output is re-validated w/ `schema` (the 
+        stage schema w/ `category_name`). Outputs already validated w/ `schema`
+        are unchanged.
+        """
+        for output in outputs:
+            if output.parsed is None or isinstance(output.parsed, schema):
+                continue
+            
+            parsed = output.parsed.model_dump()
+            key = next(
+                k for k in ("assigned_categories", "category_ranking") if k in parsed
+            )
+            items = []
+            for item in parsed[key]:
+                cat_id = item.pop("category_id")
+                if cat_id not in id_map:
+                    log.warning(
+                        f"Category ID {cat_id} not found for window"
+                        f" {parsed["window_number"]}. Dropped."
+                    )
+                    continue
+                items.append({"category_name": id_map[cat_id], **item})
+            parsed[key] = items
+            
+            output.parsed = validate_json(parsed, schema)
+        return outputs
+    
+    @staticmethod
+    def write_manifest(
+        stage_output: StageOutput,
+        subset_path: Path,
+        hashes: Dict[str, str],
+        prompts: Optional[Dict[str, str]] = None
+    ):
+        """
+        Writes the manifest of a StageOutput object (written atomically) to the
+        subset dir.
+        
+        Queued (background) response files are flushed first, & the manifest 
+        is written synchronously, so it is on disk (& only after its response
+        files) before it is checked for. The manifest includes the content hash
+        of each response file, the window numbers (Stage 2 & 3), the created 
+        time, & the token totals. If the prompts are in the blob store, it also
+        includes the blob hash of each prompt file.
+        """
+        metas = [output.meta for output in stage_output.outputs if output.meta]
+        manifest = {
+            "created": metas[0].created if metas else None,
+            "stage": stage_output.stage_name,
+            "subset": stage_output.subset,
+            "replication": stage_output.replication,
+            "total": len(hashes),
+            "windows": sorted(
+                output.parsed.window_number for output in stage_output.outputs
+                if hasattr(output.parsed, "window_number")
+            ),
+            "hashes": hashes,
+            "input_tokens": sum(meta.input_tokens for meta in metas),
+            "output_tokens": sum(meta.output_tokens for meta in metas)
+        }
+        if prompts is not None:
+            manifest["prompts"] = prompts
+        flush_writes()
+        write_json(subset_path / MANIFEST_FILE, manifest, atomic=True)
+        return None
+    
+    def export_legacy_layout(self, subset_path: Path):
+        """
+        Exports a subset dir. to the legacy layout (prompts & responses dirs. w/
+        a file for each window). Packed stores are exported, & prompts in the 
+        blob store are written to the prompts dir.
+        """
+        manifest_path = subset_path / MANIFEST_FILE
+        manifest = load_json(manifest_path) if manifest_path.exists() else {}
+        prompts = {
+            name: self.blobs.get(digest)
+            for name, digest in manifest.get("prompts", {}).items()
+        }
+        if PackedStore.exists(subset_path):
+            PackedStore(subset_path).export(prompts)
+        elif prompts:
+            prompts_path = subset_path / "prompts"
+            create_directory(prompts_path)
+            for name, prompt in prompts.items():
+                write_file(prompts_path / name, prompt)
+        return None
+    
+    def _categories_pdf(self):
+        """
+        Returns the text & path of the final form Category PDF file for Stage
+        1, 1r, & 1c.
         """
         pdf = f"# Stage {self.stage_name} Categories\n\n"
         for output in self.outputs:
@@ -77,43 +206,51 @@ class OutputProcesser:
                     pdf += f"## Unified Categories\n\n"
             pdf += categories_to_txt(categories)
         pdf_path = self.sub_path / f"_stage_{self.stage_name}_categories.pdf"
-        txt_to_pdf(pdf, pdf_path)
+        return pdf, pdf_path
+    
+    def result_table(self, stage_name: str):
+        """
+        Returns the ResultTable of a classification stage (2 & 3).
+        """
+        if stage_name not in self._result_tables:
+            self._result_tables[stage_name] = ResultTable(
+                self.sub_path / f"_stage_{stage_name}_results"
+            )
+        return self._result_tables[stage_name]
+    
+    def append_results(
+        self,
+        stage_name: str,
+        outputs: List[RequestOut],
+        replace: bool = True
+    ):
+        """
+        Appends Stage 2 & 3 outputs to the stage ResultTable.
+        """
+        self.result_table(stage_name).append(outputs, replace)
         return None
     
-    def _build_classification_output(self):
+    def _build_classification_output(self, stage_name: str):
         """
-        Builds the final form calssification CSV files for Stage 2 & 3.
+        Builds the final form calssification CSV files for Stage 2 & 3, from 
+        the stage ResultTable.
         
         Saves to subpath directory.
         """
         dfs = []
+        df = self.result_table(stage_name).to_wide()
         for case in self.cases:
             
             # Getting the original summary data file.
             if "0" not in self.stages:
                 raw_path = self.data_path / "raw"
                 og_df_path = raw_path / f"{case}_{self.treatment}_{self.ra}.csv"
-                og_df = pd.read_csv(og_df_path)
+                og_df = data_store.load(
+                    og_df_path, self.config_manager.generate_data_cache_path()
+                )
             else:
                 log.error("Stage 0 not setup yet.")
             
-            response_list = []
-            
-            # Because Stage 2 & 3 are done via one subset, should only have one 
-            # output.
-            for output in self.outputs[0].outputs:
-                response = {"reasoning": output.parsed.reasoning}
-                response["window_number"] = output.parsed.window_number
-                for cat in output_attrb(output.parsed):
-                    response[cat.category_name] = 1
-                    # If Stage 2, replace binary to rank.
-                    if hasattr(cat, "rank"):
-                        response[cat.category_name] = cat.rank
-                # Appending each response as a record.
-                response_list.append(response)
-
-            df = pd.DataFrame.from_records(response_list).fillna(0)
-            
             # Merging responses w/ og summary file.
             merged_df = pd.merge(og_df, df, on='window_number')
             merged_df["case"] = case
@@ -124,46 +261,100 @@ class OutputProcesser:
         # Concatenating case dfs, for tests w/ a composition of cases (e.g., 
         # uni_switch case).
         df = pd.concat(dfs, ignore_index=True, sort=False)
-        df.to_csv(self.sub_path / f"_stage_{self.stage_name}_final.csv", index=False)
+        df.to_csv(self.sub_path / f"_stage_{stage_name}_final.csv", index=False)
         return None
     
+    def submit_final(self, stage_outputs: List[StageOutput]):
+        """
+        Submits the build of the final forms (for all StageOutput objs. of a 
+        stage) to the ArtifactWorker. Returns the Future of the build.
+        
+        The output data is captured on submission (for Stage 2 & 3, the 
+        ResultTable is synced w/ the outputs), so the processor can be reused
+        while the build runs in the background.
+        """
+        self._set_outputs(stage_outputs)
+        if self.stage_name in {"1", "1r", "1c"}:
+            pdf, pdf_path = self._categories_pdf()
+            build = lambda: artifact_worker.render_pdf(pdf, pdf_path)
+        else:
+            stage_name = self.stage_name
+            self.result_table(stage_name).sync(self.outputs[0].outputs)
+            build = lambda: self._build_classification_output(stage_name)
+        return artifact_worker.submit((self.sub_path, self.stage_name), build)
+    
     def _write_output(self):
         """
-        Writes the raw output & prompt files.
+        Writes the raw output & prompt files in the background (or the packed
+        store, if the test is packed). If prompt blobs, prompts are written to 
+        the blob store instead, & referenced from the manifest.
+        
+        Note: Prompts of outputs w/o prompts (i.e., loaded or kept parsed only)
+        are already written, so only their responses are (re)written.
         """
         for output in self.outputs:
             # If output complete, no need to rewrite the output.
             if not output.complete and output.outputs:
-                prompts_path = self.stage_path / output.subset / "prompts"
-                responses_path = self.stage_path / output.subset / "responses"
-                create_directory([prompts_path, responses_path])
+                subset_path = self.stage_path / output.subset
                 
                 # For stages 0, 2 & 3, the system prompt is static. Highly 
                 # redundant to write the system prompt for len(responses).
-                system_prompt = output.outputs[0].prompts.system
+                system_prompt = next((
+                    response.prompts.system for response in output.outputs
+                    if response.prompts
+                ), None)
                 system_path = f"{output.subset}_stg_{self.stage_name}_system_prompt.txt"
-                write_file(prompts_path / system_path, system_prompt)
                 
+                prompts = None
+                if self.test_config.prompt_blobs:
+                    manifest_path = subset_path / MANIFEST_FILE
+                    manifest = load_json(manifest_path) if manifest_path.exists() else {}
+                    prompts = manifest.get("prompts", {})
+                    if system_prompt is not None:
+                        prompts[system_path] = self.blobs.put(system_prompt)
+                    system_prompt = None
+                
+                rows = []
                 for response in output.outputs:
-                    user_prompt = response.prompts.user
+                    user_prompt = response.prompts.user if response.prompts else None
                     
                     # Stage 2 & 3 reponse files are differentiated via window
                     # number.
                     user_path = f"{output.subset}_"
                     response_path = f"{output.subset}_"
+                    window_number = None
                     if self.stage_name in {"2", "3"}:
-                        user_path += f"{response.parsed.window_number}_user_prompt.txt"
-                        response_path += f"{response.parsed.window_number}_response.txt"
+                        window_number = response.parsed.window_number
+                        user_path += f"{window_number}_user_prompt.txt"
+                        response_path += f"{window_number}_response.txt"
                     else:
                         user_path += f"stg_{self.stage_name}_user_prompt.txt"
                         response_path += f"stg_{self.stage_name}_response.txt"
                     
                     # Responses written in a more readable JSON structure.
-                    write_file(prompts_path / user_path, user_prompt)
-                    write_file(
-                        responses_path / response_path,
-                        json.dumps(response.parsed.model_dump(), indent=2)
-                    )
+                    response_txt = json_dumps(response.parsed.model_dump(), indent=2)
+                    if prompts is not None and user_prompt is not None:
+                        prompts[user_path] = self.blobs.put(user_prompt)
+                        user_prompt = None
+                    rows.append((response_path, user_path, window_number, user_prompt, response_txt))
+                
+                if self.test_config.packed:
+                    PackedStore(subset_path).write(system_path, system_prompt, rows)
+                else:
+                    prompts_path = subset_path / "prompts"
+                    responses_path = subset_path / "responses"
+                    create_directory([prompts_path, responses_path])
+                    if system_prompt is not None:
+                        write_file(prompts_path / system_path, system_prompt, background=True)
+                    for response_path, user_path, _, user_prompt, response_txt in rows:
+                        if user_prompt is not None:
+                            write_file(prompts_path / user_path, user_prompt, background=True)
+                        write_file(responses_path / response_path, response_txt, background=True)
+                
+                # Manifest written last, so it only exists for fully written
+                # outputs.
+                hashes = {row[0]: content_hash(row[-1]) for row in rows}
+                self.write_manifest(output, subset_path, hashes, prompts)
         return None
     
     def _stage_meta_info(self, meta: TestMeta):
@@ -195,34 +386,40 @@ class OutputProcesser:
                 )
         return stage_info
     
-    def write_meta(self):
+    def _default_meta(self):
         """
-        Writes the TestMeta object for a given StageOutput obj.
-        
-        Written as a JSON in the subpath dir.
+        Returns a new TestMeta object.
+        """
+        stages = {stage: StageInfo() for stage in self.config_manager.stages}
+        return TestMeta(
+            model_info=self.model_info,
+            test_info=self.config_manager.config.convert_to_dict(),
+            stages=stages
+        )
+    
+    def _update_meta(self, meta: TestMeta):
+        """
+        Updates a TestMeta object w/ the stage specific meta info.
         """
-        # Load meta if exists. Else, create TestMeta obj.
-        if self.meta_path.exists():
-            meta = load_json_n_validate(self.meta_path, TestMeta)
-        else:
-            model_info = ModelInfo(
-                model=self.llm_instance.model,
-                parameters=self.llm_instance.configs.model_dump()
-            )
-            stages = {stage: StageInfo() for stage in self.config_manager.stages}
-            meta = TestMeta(
-                model_info=model_info,
-                test_info=self.config_manager.config.convert_to_dict(),
-                stages=stages
-            )
-        
-        # Write stage specific meta info.
         meta.stages[self.stage_name] = self._stage_meta_info(meta)
         
         # Rewriting TestConfig model in case rerunning test w/o current stages.
         meta.test_info = self.config_manager.config.convert_to_dict()
+        return meta
+    
+    def write_meta(self, stage_outputs: List[StageOutput], flush: bool = False):
+        """
+        Writes the TestMeta object for the given StageOutput objs.
         
-        write_json(self.meta_path, meta.model_dump())
+        Updated in memory via the shared MetaWriter, & written as a JSON in the
+        subpath dir. on its flush interval (or immediately if flush).
+        """
+        self._set_outputs(stage_outputs)
+        
+        # Loads meta if exists. Else, creates TestMeta obj.
+        meta_writer.update(
+            self.meta_path, self._update_meta, self._default_meta, flush
+        )
         
         log.info(
             f"\nMeta data successully written for:"
@@ -234,16 +431,15 @@ class OutputProcesser:
         )
         return None
         
-    def process(self, stage_complete: bool = False):
+    def process(self, stage_outputs: List[StageOutput], stage_complete: bool = False):
         """
-        Writes outputs & meta. If stage_complete True, writes the final forms
-        for the given stage (defined on initialization).
+        Writes outputs & meta for the given StageOutput objs. If stage_complete
+        True, submits the final forms for the stage & flushes the meta.
         """
+        self._set_outputs(stage_outputs)
         self._write_output()
-        self.write_meta()
-        if stage_complete:
-            if self.stage_name in {"1", "1r", "1c"}:
-                self._build_categories_pdf()
-            else:
-                self._build_classification_output()
+        self.write_meta(stage_outputs, flush=stage_complete)
+        # Final forms are built in the background (unless only on export).
+        if stage_complete and not self.test_config.export_only:
+            self.submit_final(stage_outputs)
         return None
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Packed store module.
+
+Contains the PackedStore model.
+"""
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils import create_directory, write_file
+
+
+log = logging.getLogger(__name__)
+
+# Packed store file written in each stage subset dir.
+PACKED_FILE = "_packed.sqlite"
+
+
+
+class PackedStore:
+    """
+    PackedStore model.
+    
+    A single SQLite file for the outputs of a stage subset (instead of a user
+    prompt & response file for each window), indexed on window number. Rows
+    are keyed by the legacy response file name, so the legacy layout can be
+    exported (see `export`).
+    """
+    def __init__(self, subset_path: Path):
+        self.subset_path = Path(subset_path)
+        self.db_path = self.subset_path / PACKED_FILE
+    
+    @staticmethod
+    def exists(subset_path: Path):
+        """
+        Returns whether a subset dir. has a packed store.
+        """
+        return (Path(subset_path) / PACKED_FILE).exists()
+    
+    def _connect(self):
+        """
+        Returns a connection to the store (tables created if not exist).
+        """
+        self.subset_path.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS system ("
+            " name TEXT PRIMARY KEY, prompt TEXT);"
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " name TEXT PRIMARY KEY, user_name TEXT, window_number INTEGER,"
+            " user TEXT, response TEXT);"
+            "CREATE INDEX IF NOT EXISTS responses_window"
+            " ON responses (window_number);"
+        )
+        return conn
+    
+    def write(
+        self,
+        system_name: str,
+        system: str,
+        rows: List[Tuple[str, str, Optional[int], str, str]]
+    ):
+        """
+        Writes (replaces) the system prompt & the response rows, as (name,
+        user_name, window_number, user, response), in one transaction. Prompts
+        are None if already stored (or in the blob store).
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                # Prompts not given (None) keep their stored prompts.
+                conn.execute(
+                    "INSERT INTO system VALUES (?, ?) ON CONFLICT (name) DO UPDATE"
+                    " SET prompt = COALESCE(excluded.prompt, prompt)",
+                    (system_name, system)
+                )
+                conn.executemany(
+                    "INSERT INTO responses VALUES (?, ?, ?, ?, ?) ON CONFLICT (name)"
+                    " DO UPDATE SET user_name = excluded.user_name,"
+                    " window_number = excluded.window_number,"
+                    " user = COALESCE(excluded.user, user),"
+                    " response = excluded.response",
+                    rows
+                )
+        finally:
+            conn.close()
+        return None
+    
+    def responses(self) -> Dict[str, str]:
+        """
+        Returns the responses, keyed by the response file name.
+        """
+        conn = self._connect()
+        try:
+            return dict(conn.execute("SELECT name, response FROM responses"))
+        finally:
+            conn.close()
+    
+    def response(self, name: str) -> Optional[str]:
+        """
+        Returns a response by its file name. None if not in the store.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT response FROM responses WHERE name = ?", (name,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+    
+    def export(self, prompts: Optional[Dict[str, str]] = None):
+        """
+        Exports the store to the legacy layout (prompts & responses dirs. w/ a
+        file for each window) in the subset dir. Prompts not in the store (i.e.,
+        in the blob store) are taken from `prompts`, keyed by file name, & are
+        not written if missing.
+        """
+        prompts = prompts or {}
+        prompts_path = self.subset_path / "prompts"
+        responses_path = self.subset_path / "responses"
+        create_directory([prompts_path, responses_path])
+        
+        conn = self._connect()
+        try:
+            for name, prompt in conn.execute("SELECT name, prompt FROM system"):
+                prompt = prompt if prompt is not None else prompts.get(name)
+                if prompt is not None:
+                    write_file(prompts_path / name, prompt)
+            rows = conn.execute("SELECT name, user_name, user, response FROM responses")
+            for name, user_name, user, response in rows:
+                user = user if user is not None else prompts.get(user_name)
+                if user is not None:
+                    write_file(prompts_path / user_name, user)
+                write_file(responses_path / name, response)
+        finally:
+            conn.close()
+        return None
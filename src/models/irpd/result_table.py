@@ -0,0 +1,215 @@
+"""
+Result table module.
+
+Contains the ResultTable model.
+"""
+import logging
+import threading
+import pandas as pd
+from pathlib import Path
+from typing import List, Optional
+
+from utils import json_dumps
+from tools.functions import output_attrb
+from models.request_output import RequestOut
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+log = logging.getLogger(__name__)
+
+# Number of buffered rows written as one table part.
+FLUSH_ROWS = 500
+
+
+
+class ResultTable:
+    """
+    ResultTable model.
+    
+    An incremental, long-format table of Stage 2 & 3 classifications, w/ a row
+    for each (window, category). Windows are appended as they arrive &
+    written in parts (Parquet files w/ a dictionary encoded category column,
+    or JSONL if pyarrow is not installed).
+    
+    Each append has a sequence number, so a re-classified window replaces its
+    prior rows. When a stage subset is rewritten, stale or replaced rows are 
+    cleared (see `sync`). The wide table (as in the legacy final CSV) is only 
+    built from the parts when requested.
+    """
+    def __init__(self, table_path: Path, flush_rows: int = FLUSH_ROWS):
+        self.table_path = Path(table_path)
+        self.flush_rows = flush_rows
+        self._lock = threading.Lock()
+        self._rows: List[dict] = []
+        self._windows: Optional[set] = None
+        self._seq: int = 0
+        self._parts: int = 0
+    
+    def _read(self) -> pd.DataFrame:
+        """
+        Returns the long-format table from the written parts.
+        """
+        columns = ["seq", "window_number", "category", "value", "reasoning"]
+        if not self.table_path.exists():
+            return pd.DataFrame(columns=columns)
+        if pq:
+            parts = sorted(self.table_path.glob("part-*.parquet"))
+            if not parts:
+                return pd.DataFrame(columns=columns)
+            return pq.read_table(parts).to_pandas()
+        path = self.table_path / "parts.jsonl"
+        if not path.exists():
+            return pd.DataFrame(columns=columns)
+        return pd.read_json(path, lines=True)
+    
+    def _load_state(self):
+        """
+        Loads the appended windows & the next sequence/part numbers from the
+        written parts (once).
+        """
+        if self._windows is not None:
+            return None
+        df = self._read()
+        self._windows = set(df["window_number"].astype(int))
+        self._seq = int(df["seq"].max()) + 1 if len(df) else 0
+        self._parts = len(list(self.table_path.glob("part-*"))) if self.table_path.exists() else 0
+        return None
+    
+    def _write_part(self, rows: List[dict]):
+        """
+        Writes rows as a table part.
+        """
+        self.table_path.mkdir(parents=True, exist_ok=True)
+        if pq:
+            table = pa.Table.from_pylist(rows, schema=pa.schema([
+                ("seq", pa.int64()),
+                ("window_number", pa.int64()),
+                ("category", pa.dictionary(pa.int32(), pa.string())),
+                ("value", pa.int64()),
+                ("reasoning", pa.string())
+            ]))
+            pq.write_table(table, self.table_path / f"part-{self._parts:05d}.parquet")
+            self._parts += 1
+        else:
+            with open(self.table_path / "parts.jsonl", "a") as f:
+                for row in rows:
+                    f.write(json_dumps(row) + "\n")
+        return None
+    
+    def append(self, outputs: List[RequestOut], replace: bool = True):
+        """
+        Appends the classified windows of Stage 2 & 3 outputs. If not replace,
+        windows already in the table are skipped.
+        """
+        with self._lock:
+            self._load_state()
+            for output in outputs:
+                parsed = output.parsed
+                if parsed is None:
+                    continue
+                if not replace and parsed.window_number in self._windows:
+                    continue
+                
+                # Reasoning is only stored on the first row of a window, &
+                # windows w/o categories are a single row.
+                reasoning = getattr(parsed, "reasoning", None)
+                categories = output_attrb(parsed) or [None]
+                for cat in categories:
+                    self._rows.append({
+                        "seq": self._seq,
+                        "window_number": parsed.window_number,
+                        "category": cat.category_name if cat else None,
+                        "value": getattr(cat, "rank", 1) if cat else None,
+                        "reasoning": reasoning
+                    })
+                    reasoning = None
+                self._windows.add(parsed.window_number)
+                self._seq += 1
+            
+            if len(self._rows) >= self.flush_rows:
+                self._write_part(self._rows)
+                self._rows = []
+        return None
+    
+    def _clear(self):
+        """
+        Deletes the written parts & buffered rows, & resets the table state.
+        """
+        if self.table_path.exists():
+            for path in self.table_path.iterdir():
+                path.unlink()
+        self._rows = []
+        self._windows = set()
+        self._seq = 0
+        self._parts = 0
+        return None
+    
+    def sync(self, outputs: List[RequestOut]):
+        """
+        Syncs the table w/ the (complete) outputs of a stage subset, when the 
+        subset is written. Windows not yet in the table are appended. If the 
+        table has windows not in the outputs (e.g., from a prior run of the 
+        replication) or replaced rows, it is rewritten from the outputs.
+        """
+        windows = {
+            output.parsed.window_number for output in outputs
+            if output.parsed is not None
+        }
+        with self._lock:
+            self._load_state()
+            rewrite = bool(self._windows - windows) or self._seq > len(self._windows)
+            if rewrite:
+                self._clear()
+        self.append(outputs, replace=False)
+        self.flush()
+        return None
+    
+    def flush(self):
+        """
+        Writes the buffered rows.
+        """
+        with self._lock:
+            if self._rows:
+                self._write_part(self._rows)
+                self._rows = []
+        return None
+    
+    def to_wide(self) -> pd.DataFrame:
+        """
+        Returns the wide table (a row for each window, & a column for each
+        category, as in the legacy final CSV) from the latest append of each
+        window.
+        """
+        self.flush()
+        df = self._read()
+        df = df[df["seq"] == df.groupby("window_number")["seq"].transform("max")]
+        
+        # Categories in order of first appearance (as in the legacy final CSV).
+        categories = [str(c) for c in df["category"].dropna().unique()]
+        
+        reasoning = df.dropna(subset=["reasoning"]).set_index("window_number")["reasoning"]
+        wide = (
+            df.dropna(subset=["category"])
+            .pivot_table(
+                index="window_number",
+                columns="category",
+                values="value",
+                aggfunc="max",
+                observed=True
+            )
+            .reindex(sorted(df["window_number"].unique()))
+            .fillna(0)
+        )
+        wide.columns = wide.columns.astype(str)
+        wide = wide.reindex(columns=categories)
+        wide.columns.name = None
+        wide = wide.rename_axis("window_number").reset_index()
+        if len(reasoning):
+            wide.insert(0, "reasoning", wide["window_number"].map(reasoning))
+        return wide
@@ -4,7 +4,8 @@ Schemas module.
 Contains the Pydantic output schemas for all stages. Used for JSON structured 
 outputs of LLMs.
 """
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, create_model
 
 
 # Schemas for stage schemas containing list of outputs (such as categories or
@@ -56,4 +57,44 @@ class Stage2Schema(BaseModel):
 class Stage3Schema(BaseModel):
     window_number: int
     category_ranking: list[Ranking]
-    reasoning: str
\ No newline at end of file
+    reasoning: str
+
+
+def classification_schema(
+    stage_name: str,
+    category_ids: Optional[List[str]] = None,
+    reasoning: bool = True
+) -> type[BaseModel]:
+    """
+    Builds a Stage 2 or 3 schema at run time.
+    
+    If `category_ids` is specified, the category field is an enum of the IDs
+    (i.e., `category_id`) instead of the free-text `category_name`. If 
+    `reasoning` is False, the reasoning field is dropped (fast mode).
+    """
+    if category_ids:
+        category_field = ("category_id", (Literal[tuple(category_ids)], ...))
+        suffix = "Id"
+    else:
+        category_field = ("category_name", (str, ...))
+        suffix = ""
+    
+    if stage_name == "2":
+        item = create_model(
+            f"CategoryAssignment{suffix}", **dict([category_field])
+        )
+        fields = {"assigned_categories": (list[item], ...)}
+    elif stage_name == "3":
+        item = create_model(
+            f"Ranking{suffix}", **dict([category_field]), rank=(int, ...)
+        )
+        fields = {"category_ranking": (list[item], ...)}
+    else:
+        raise ValueError(f"Stage {stage_name} is not a classification stage.")
+    
+    if reasoning:
+        fields["reasoning"] = (str, ...)
+    
+    return create_model(
+        f"Stage{stage_name}{suffix}Schema", window_number=(int, ...), **fields
+    )
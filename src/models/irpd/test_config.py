@@ -26,6 +26,19 @@ class TestConfig:
     total_replications: int = None
     cases: List[str] = None
     max_instances: Optional[int] = None
+    category_ids: bool = False
+    reasoning: bool = True
+    user_format: str = "records"
+    max_examples: Optional[int] = None
+    max_reasoning_chars: Optional[int] = None
+    shard_tokens: Optional[int] = None
+    tree_merge: bool = False
+    export_only: bool = False
+    packed: bool = False
+    prompt_blobs: bool = False
+    parsed_only: bool = False
+    hot_stages: Optional[int] = None
+    data_cache: bool = False
     id: Optional[str] = None
     
     def __post_init__(self):
@@ -23,6 +23,9 @@ class StageOutput:
     batch_path: Path = None
     outputs: List[RequestOut] = field(default_factory=list)
     complete: bool = False
+    # Complete outputs w/ a manifest (found on initialization, or evicted) are
+    # loaded on retrieval.
+    deferred: bool = False
 
 
 @dataclass
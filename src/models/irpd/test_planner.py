@@ -0,0 +1,251 @@
+"""
+Test planner module.
+
+Contains the TestPlanner model.
+"""
+import logging
+import pandas as pd
+from typing import Dict, Optional
+
+from utils import load_config, load_json
+from tools.functions import estimate_tokens
+from models.llm_model import LLMModel
+from models.irpd.test_config import TestConfig
+from models.irpd.test_prompts import TestPrompts
+from models.irpd.test_outputs import StageOutput
+from models.irpd.output_manager import OutputManager
+from models.irpd.output_processer import MANIFEST_FILE
+
+
+log = logging.getLogger(__name__)
+
+CONFIGS = load_config("plan_configs.yml")
+PRICING = CONFIGS["pricing"]
+DEFAULTS = CONFIGS["defaults"]
+
+
+
+class TestPlanner:
+    """
+    TestPlanner model.
+    
+    Plans (i.e., dry runs) test configs. The prompts of every incomplete stage
+    subset are composed (but not requested), & the requests, tokens, cost &
+    wall time are estimated per LLM & stage.
+    
+    Input tokens are estimated w/ `estimate_tokens` (tiktoken, if installed).
+    Output tokens per request are calibrated from the manifests of completed
+    stage subsets (per LLM & stage, else per stage), or else the plan config
+    defaults. Prompt parts from stages not yet run (e.g., the Stage 2 & 3
+    categories) are estimated as the output tokens of those stages.
+    """
+    def __init__(
+        self,
+        test_configs: Dict[str, TestConfig],
+        output_managers: Dict[str, OutputManager],
+        concurrency: int = 1,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        output_tokens: Optional[Dict[str, int]] = None
+    ):
+        assert concurrency >= 1, "`concurrency` must be greater than 0."
+        self.test_configs = test_configs
+        self.output_managers = output_managers
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.output_tokens = output_tokens or {}
+        self._calibrated = self._calibrate()
+    
+    def _calibrate(self):
+        """
+        Returns the output tokens per request of each (LLM, stage) & (None,
+        stage), from the manifests of completed stage subsets.
+        """
+        totals: Dict[tuple, tuple] = {}
+        for config_id in self.test_configs:
+            output_manager = self.output_managers[config_id]
+            for llm_str, test_output in output_manager.test_outputs.items():
+                for stage_output in test_output.stage_outputs:
+                    if not stage_output.complete:
+                        continue
+                    manifest_path = output_manager.config_manager.generate_subset_path(
+                        stage_output.replication,
+                        llm_str,
+                        stage_output.stage_name,
+                        stage_output.subset
+                    ) / MANIFEST_FILE
+                    if not manifest_path.exists():
+                        continue
+                    manifest = load_json(manifest_path)
+                    for key in [(llm_str, stage_output.stage_name), (None, stage_output.stage_name)]:
+                        tokens, total = totals.get(key, (0, 0))
+                        totals[key] = (tokens + manifest["output_tokens"], total + manifest["total"])
+        return {key: tokens / total for key, (tokens, total) in totals.items() if total}
+    
+    def _output_tokens(self, config: TestConfig, llm_str: str, stage_name: str):
+        """
+        Returns the estimated output tokens per request of a stage.
+        """
+        if stage_name in self.output_tokens:
+            return self.output_tokens[stage_name]
+        for key in [(llm_str, stage_name), (None, stage_name)]:
+            if key in self._calibrated:
+                return self._calibrated[key]
+        if not config.reasoning and stage_name in DEFAULTS["output_tokens_no_reasoning"]:
+            return DEFAULTS["output_tokens_no_reasoning"][stage_name]
+        return DEFAULTS["output_tokens"][stage_name]
+    
+    def _plan_stage_output(
+        self,
+        config: TestConfig,
+        output_manager: OutputManager,
+        stage_output: StageOutput
+    ):
+        """
+        Returns the estimated requests & tokens of an (incomplete) StageOutput
+        object, from its composed prompts.
+        """
+        llm_str = stage_output.llm_str
+        stage_name = stage_output.stage_name
+        n = stage_output.replication
+        output_tokens = lambda stage: self._output_tokens(config, llm_str, stage)
+        
+        # Partial outputs are loaded, so completed windows are not planned.
+        output_manager.load_outputs(stage_output)
+        test_prompts = TestPrompts(
+            llm_str=llm_str,
+            stage_name=stage_name,
+            replication=n,
+            subset=stage_output.subset,
+            output_manager=output_manager
+        )
+        system = estimate_tokens(test_prompts.system)
+        users = [
+            estimate_tokens(test_prompts.serialize_user(user))
+            for user in test_prompts.iter_user()
+        ]
+        
+        # Categories from stages not yet run.
+        sets = len(output_manager.config_manager.get_subsets("1r"))
+        if stage_name == "1r" and not sum(users):
+            users = [output_tokens("1")]
+        if stage_name == "1c" and not sum(users):
+            users = [sets * output_tokens("1r")]
+        if stage_name in {"2", "3"} and not output_manager.get_categories(llm_str, n):
+            system += output_tokens("1c")
+        
+        requests = len(users)
+        input_tokens = requests * system + sum(users)
+        total_output_tokens = requests * output_tokens(stage_name)
+        
+        # Stage 1 shards are merged w/ a stage 1r prompt.
+        if stage_name == "1" and requests > 1:
+            merge_system = estimate_tokens(TestPrompts(
+                llm_str=llm_str,
+                stage_name="1r",
+                replication=n,
+                subset=stage_output.subset,
+                output_manager=output_manager
+            ).system)
+            input_tokens += merge_system + requests * output_tokens("1")
+            total_output_tokens += output_tokens("1r")
+            requests += 1
+        
+        # Stage 1c merge tree merges category sets pairwise.
+        if stage_name == "1c" and config.tree_merge and sets > 2:
+            requests = sets - 1
+            input_tokens = requests * (system + 2 * output_tokens("1r"))
+            total_output_tokens = requests * output_tokens("1c")
+        
+        # Sharded stage 1 & stage 1c merge trees are always run via completions.
+        completions_only = (
+            (stage_name == "1" and config.shard_tokens)
+            or (stage_name == "1c" and config.tree_merge)
+        )
+        return {
+            "llm": llm_str,
+            "stage": stage_name,
+            "batch": bool(
+                config.batches
+                and LLMModel[llm_str].other_args.batches
+                and not completions_only
+            ),
+            "requests": requests,
+            "input_tokens": input_tokens,
+            "output_tokens": round(total_output_tokens)
+        }
+    
+    @staticmethod
+    def _cost(row: pd.Series):
+        """
+        Returns the projected cost (USD) of a plan row.
+        """
+        pricing = PRICING.get(row["llm"])
+        if not pricing:
+            log.warning(f"No pricing for {row['llm']}.")
+            return float("nan")
+        cost = (
+            row["input_tokens"] * pricing["input"]
+            + row["output_tokens"] * pricing["output"]
+        ) / 1e6
+        return cost * DEFAULTS["batch_discount"] if row["batch"] else cost
+    
+    def _wall_seconds(self, row: pd.Series):
+        """
+        Returns the expected wall time (seconds) of a plan row, bound by the
+        concurrency & the rate limits. NaN for batches (turnaround is up to
+        the provider).
+        """
+        if row["batch"]:
+            return float("nan")
+        if not row["requests"]:
+            return 0.0
+        latency = (
+            DEFAULTS["latency"]
+            + row["output_tokens"] / row["requests"] / DEFAULTS["output_tps"]
+        )
+        seconds = row["requests"] * latency / self.concurrency
+        if self.requests_per_minute:
+            seconds = max(seconds, 60 * row["requests"] / self.requests_per_minute)
+        if self.tokens_per_minute:
+            tokens = row["input_tokens"] + row["output_tokens"]
+            seconds = max(seconds, 60 * tokens / self.tokens_per_minute)
+        return seconds
+    
+    def plan(self) -> pd.DataFrame:
+        """
+        Returns a DataFrame of the estimated requests, input & output tokens,
+        cost & wall time of the incomplete stages, per LLM & stage (summed
+        across test configs, replications & subsets).
+        """
+        rows = []
+        for config_id, config in self.test_configs.items():
+            output_manager = self.output_managers[config_id]
+            for llm_str in config.llms:
+                for stage_name in config.stages:
+                    stage_outputs = output_manager.retrieve(
+                        llm_str=llm_str, stage_name=stage_name, load=False
+                    )
+                    rows += [
+                        self._plan_stage_output(config, output_manager, stage_output)
+                        for stage_output in stage_outputs
+                        if not stage_output.complete
+                    ]
+        
+        columns = ["llm", "stage", "batch", "requests", "input_tokens", "output_tokens"]
+        df = pd.DataFrame(rows, columns=columns)
+        df = df.groupby(["llm", "stage", "batch"], sort=False, as_index=False).sum()
+        df["cost"] = df.apply(self._cost, axis=1) if len(df) else []
+        df["wall_seconds"] = df.apply(self._wall_seconds, axis=1) if len(df) else []
+        
+        log.info(
+            f"\nPlan:"
+            f"\n\t configs: {len(self.test_configs)}"
+            f"\n\t requests: {df['requests'].sum()}"
+            f"\n\t input_tokens: {df['input_tokens'].sum()}"
+            f"\n\t output_tokens: {df['output_tokens'].sum()}"
+            f"\n\t cost: {df['cost'].sum():.2f}"
+            f"\n\t wall_seconds: {df['wall_seconds'].sum():.0f}"
+        )
+        return df
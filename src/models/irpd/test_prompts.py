@@ -3,17 +3,55 @@ Test prompts module.
 
 Contains the TestPrompts module and its corresponding methods.
 """
+import os
 import logging
+import threading
 import pandas as pd
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, List, Tuple
 
-from tools.functions import categories_to_txt, output_attrb
-from utils import file_to_string, to_list
+from tools.functions import (
+    categories_to_txt, output_attrb, records_to_txt, estimate_tokens, USER_FORMATS
+)
+from utils import file_to_string, to_list, content_hash
 from models.prompts import Prompts
 from models.irpd.output_manager import OutputManager
+from models.irpd.data_store import data_store
 
 
 log = logging.getLogger(__name__)
 
+# Process-wide cache of prompt section files, keyed by path (w/ the mtime the
+# section was read at).
+_sections: Dict[Path, Tuple[int, str]] = {}
+_sections_lock = threading.Lock()
+
+# Maximum number of memoized system prompts (the least recently used are 
+# dropped).
+MAX_SYSTEM_PROMPTS = 64
+
+
+
+def read_section(section_path: Path) -> Tuple[str, int]:
+    """
+    Returns a prompt section file (& its mtime). Cached until the file is 
+    modified.
+    """
+    try:
+        mtime = os.stat(section_path).st_mtime_ns
+    except FileNotFoundError:
+        return file_to_string(section_path), None
+    
+    with _sections_lock:
+        cached = _sections.get(section_path)
+    if cached and cached[0] == mtime:
+        return cached[1], mtime
+    
+    section = file_to_string(section_path)
+    with _sections_lock:
+        _sections[section_path] = (mtime, section)
+    return section, mtime
 
 
 class TestPrompts:
@@ -21,7 +59,16 @@ class TestPrompts:
     TestPrompts model.
     
     Gets the user and system prompts for a given stage, replication, and subset.
+    
+    System prompts are memoized per (test, stage, case, ra, treatment, llm, 
+    replication), & reused while their section files (& categories) are 
+    unchanged. Only the most recently used `MAX_SYSTEM_PROMPTS` are kept, w/
+    the categories as a hash of their rendered text (so evicted stages are 
+    not held in memory).
     """
+    _system_prompts: OrderedDict = OrderedDict()
+    _system_lock = threading.Lock()
+    
     def __init__(
         self,
         llm_str: str,
@@ -49,15 +96,25 @@ class TestPrompts:
         self.sections_path = self.prompts_path / "sections"
         self.fixed_path = self.prompts_path / "fixed"
         
+        # Section files (& their mtimes) read for the system prompt.
+        self._sections_read: List[tuple] = []
+        
         self._construct_system_prompt()
         self._construct_user_prompt()
     
-    @staticmethod
-    def _get_section(section_path, name):
+    def _read(self, section_path: Path):
+        """
+        Returns a prompt section file (cached), & records it as read.
+        """
+        section, mtime = read_section(section_path)
+        self._sections_read.append((section_path, mtime))
+        return section
+    
+    def _get_section(self, section_path, name):
         """
         Returns the prompt section & logs if was found to be empty.
         """
-        section = file_to_string(section_path)
+        section = self._read(section_path)
         if not section:
             log.warning(f"{name} was empty.")
         return section + "\n"
@@ -68,7 +125,7 @@ class TestPrompts:
         """
         section_path = self.sections_path / "task_overview" / f"stage_{self.stage_name}.md"
         return self._get_section(section_path, "Task Overview")
-
+    
     def _experimental_context(self):
         """
         Returns the 'Experimental Context' section of the system prompt.
@@ -109,99 +166,197 @@ class TestPrompts:
         stage_path = section_path / f"stage_{self.stage_name}"
         
         # Initial prompt section (header).
-        section = file_to_string(section_path / "initial.md")
+        section = self._read(section_path / "initial.md")
         
         # RA summary context.
         if self.stage_name not in {"0"}:
-            section += file_to_string(stage_path / f"{self.ra}.md")
+            section += self._read(stage_path / f"{self.ra}.md")
         
         # Instance type definition.
         subset_path = stage_path / "instance_type"
-        section += file_to_string(subset_path / "initial.md")
+        section += self._read(subset_path / "initial.md")
         for case in self.cases:
-            section += file_to_string(subset_path / f"{case}.md")
+            section += self._read(subset_path / f"{case}.md")
         
         # Adding definition of category assignment variable.
         if self.stage_name in {"3"}:
-            section += file_to_string(stage_path / f"assignment.md")
+            section += self._read(stage_path / f"assignment.md")
         
         # Window number definition.
-        section += file_to_string(stage_path / "window_number.md")
+        section += self._read(stage_path / "window_number.md")
         
         return section
     
+    def _system_prompt_valid(self, memo: tuple, categories_hash: str):
+        """
+        Returns whether a memoized system prompt is valid (i.e., its section 
+        files are unmodified & its categories are the same).
+        """
+        sections_read, memo_hash, _ = memo
+        if memo_hash != categories_hash:
+            return False
+        for section_path, mtime in sections_read:
+            try:
+                if os.stat(section_path).st_mtime_ns != mtime:
+                    return False
+            except FileNotFoundError:
+                return False
+        return True
+    
     def _construct_system_prompt(self):
         """
-        Constructs the system prompts & sets as the system attrb.
+        Constructs the system prompts & sets as the system attrb. (memoized).
         """
+        # Almost always will use Stage 1c categories, but if skipped, this 
+        # should adjust the appended categories to include all stage 1r 
+        # subset categories.
+        categories_txt = ""
+        if self.stage_name in {"2", "3"}:
+            categories = self.output_manager.get_categories(
+                self.llm_str, self.replication
+            )
+            categories_txt = categories_to_txt(
+                categories,
+                self.test_config.category_ids,
+                self.test_config.max_examples,
+                self.test_config.max_reasoning_chars
+            )
+        categories_hash = content_hash(categories_txt)
+        
+        key = (
+            self.test_config.id, self.stage_name, self.case, self.ra, 
+            self.treatment, self.llm_str, self.replication
+        )
+        with self._system_lock:
+            memo = self._system_prompts.get(key)
+            if memo:
+                self._system_prompts.move_to_end(key)
+        if memo and self._system_prompt_valid(memo, categories_hash):
+            self.system = memo[2]
+            return None
+        
+        self._sections_read = []
         a = self._task_overview()
         b = self._experimental_context()
         c = self._summary_context()
         d = self._task()
         e = self._constraints()
-        prompt = a + b + c + d + e
+        parts = [a, b, c, d, e]
         
         # Adding 'Data Variable Definitions' to stages w/ data in user prompt.
         if self.stage_name in {"1", "2", "3"}:
-            prompt += self._data_definitions()
+            parts.append(self._data_definitions())
         
         # Appending a 'Categories' section to classification stages.
         if self.stage_name in {"2", "3"}:
-            prompt += "\n\n## Categories\n\n"
-            
-            # Almost always will use Stage 1c categories, but if skipped, this 
-            # should adjust the appended categories to include all stage 1r 
-            # subset categories.
-            if "1c" in self.test_config.stages:
-                context = self.output_manager.retrieve(
-                    self.llm_str, self.replication, "1c", "full"
-                )
-            else:
-                context = self.output_manager.retrieve(
-                    self.llm_str, self.replication, "1r"
-                )
-            for output in context:
-                categories = output_attrb(output.outputs[0].parsed)
-                prompt += categories_to_txt(categories)
+            parts.append("\n\n## Categories\n\n")
+            parts.append(categories_txt)
         
-        self.system = prompt
+        self.system = "".join(parts)
+        with self._system_lock:
+            self._system_prompts[key] = (self._sections_read, categories_hash, self.system)
+            self._system_prompts.move_to_end(key)
+            while len(self._system_prompts) > MAX_SYSTEM_PROMPTS:
+                self._system_prompts.popitem(last=False)
         return None
     
-    def _construct_user_prompt(self):
+    def _summary_data(self):
         """
-        Sets the user attrb. as (all) user prompt(s).
+        Returns the RA summary data for the test's cases, treatment, and RA.
         """
-        # Getting the correct RA summary data if a data dependent stage.
-        if "0" not in self.test_config.stages and self.stage not in {"1", "1r"}:
-            # Loading RA summary data.
-            summary_path = self.data_path / "ra_summaries.csv"
-            df = pd.read_csv(summary_path)
-            
-            # Getting all summary data in cases attrb. (in case of case 
-            # composition).
-            df = df[(df["case"].isin(self.cases))]
-            
-            # Adjusting for the treatment (if not merged).
-            if self.treatment != "merged":
-                df = df[(df["treatment"] == self.treatment)]
-            
-            # Adjusting for a singular RA.
-            if self.ra != "both":
-                ra_cols = [
-                    c for c in df.columns
-                    if c.startswith("summary_") and c != f"summary_{self.ra}"
-                ]
-                df = df.drop(columns=ra_cols)
-            
-            # Dropping unused variables.
-            df = df.drop(columns=["case", "treatment", "subset"])
-        else:
+        if "0" in self.test_config.stages:
             log.error("Stage 0 has not been setup yet for prompts.")
             raise ValueError
         
-        # Stage 1 is all summary data (in records form).
+        # RA summary data in cases attrb. (in case of case composition), & 
+        # adjusted for the treatment (if not merged). Shared by the DataStore,
+        # so not modified in place.
+        summary_path = self.data_path / "ra_summaries.csv"
+        df = data_store.summaries(
+            summary_path,
+            self.cases,
+            self.treatment,
+            self.output_manager.config_manager.generate_data_cache_path()
+        )
+        
+        # Adjusting for a singular RA.
+        if self.ra != "both":
+            ra_cols = [
+                c for c in df.columns
+                if c.startswith("summary_") and c != f"summary_{self.ra}"
+            ]
+            df = df.drop(columns=ra_cols)
+        
+        # Dropping unused variables.
+        return df.drop(columns=["case", "treatment", "subset"])
+    
+    @staticmethod
+    def filter_completed(df: pd.DataFrame, outputs: list):
+        """
+        Returns the summary data w/o the windows of completed (Stage 2 or 3)
+        outputs.
+        """
+        completed = pd.Index([output.parsed.window_number for output in outputs])
+        return df[~df["window_number"].isin(completed)]
+    
+    @staticmethod
+    def assign_categories(df: pd.DataFrame, outputs: list):
+        """
+        Returns the summary data w/ an 'assigned_categories' variable, the 
+        Stage 2 categories of each window (joined on window number). Windows 
+        w/o a Stage 2 output are NaN.
+        """
+        assignments = pd.DataFrame({
+            "window_number": [output.parsed.window_number for output in outputs],
+            "assigned_categories": [
+                str([cat.category_name for cat in output.parsed.assigned_categories])
+                for output in outputs
+            ]
+        }).drop_duplicates("window_number", keep="last")
+        return df.merge(assignments, on="window_number", how="left")
+    
+    def _shard_records(self, records: list):
+        """
+        Splits summary data records into shards, where the estimated tokens of
+        each shard is within the shard token budget.
+        """
+        shards, shard, shard_tokens = [], [], 0
+        for record in records:
+            tokens = estimate_tokens(
+                records_to_txt(record, self.test_config.user_format)
+            )
+            if shard and shard_tokens + tokens > self.test_config.shard_tokens:
+                shards.append(shard)
+                shard, shard_tokens = [], 0
+            shard.append(record)
+            shard_tokens += tokens
+        if shard:
+            shards.append(shard)
+        
+        if len(shards) > 1:
+            log.info(
+                f"Stage {self.stage_name} subset {self.subset} split into"
+                f" {len(shards)} shards."
+            )
+        return shards
+    
+    def _construct_user_prompt(self):
+        """
+        Sets the user prompt(s) (a list, or a DataFrame of summary records for
+        Stage 2 & 3).
+        """
+        # Getting the correct RA summary data if a data dependent stage.
+        if self.stage_name in {"1", "2", "3"}:
+            df = self._summary_data()
+        
+        # Stage 1 is all summary data (in records form). If sharded, a prompt
+        # for each shard.
         if self.stage_name == "1":
-            self.user = [df.to_dict("records")] # Essentially nested list.
+            records = df.to_dict("records")
+            if self.test_config.shard_tokens:
+                self._users = self._shard_records(records)
+            else:
+                self._users = [records] # Essentially nested list.
         
         # Stage 1r & 1c user prompt is the categories created in prior stage.
         if self.stage_name in {"1r", "1c"}:
@@ -211,21 +366,23 @@ class TestPrompts:
             # Stage 1r uses stage 1 categories, stage 1c uses stage 1r categories.
             context_stage = "1" if self.stage_name == "1r" else "1r"
             
-            context = self.output_manager.retrieve(
+            context = self.output_manager.read_outputs(
                 self.llm_str, self.replication, context_stage, subset
             )
             
             prompt = ""
-            for output in context:
-                categories = output_attrb(output.outputs[0].parsed)
+            for outputs in context:
+                if not outputs:
+                    continue
+                categories = output_attrb(outputs[0].parsed)
                 prompt += categories_to_txt(categories)
-            self.user = to_list(prompt)
+            self._users = to_list(prompt)
         
         # Individual summaries for stages 2 & 3.
         if self.stage_name in {"2", "3"}:
-            current_outputs = self.output_manager.retrieve(
+            current_outputs = self.output_manager.read_outputs(
                 self.llm_str, self.replication, self.stage_name, self.subset
-            )
+            )[0]
             
             # Adjusting for max instances if specified.
             if self.test_config.max_instances:
@@ -233,39 +390,90 @@ class TestPrompts:
             
             # Adjusting for completed classifications in output. Really only 
             # adjusted if test wasn't complete or failed before.
-            if current_outputs[0].outputs:
-                window_nums = [
-                    output.parsed.window_number 
-                    for output in current_outputs.outputs
-                ]
-                df = df[~df["window_number"].isin(window_nums)]
+            if current_outputs:
+                df = self.filter_completed(df, current_outputs)
             
             # Stage 3 adds another variable for the classifications in stage 2.
             if self.stage_name in {"3"}:
-                stage_2 = self.output_manager.retrieve(
+                stage_2 = self.output_manager.read_outputs(
                     self.llm_str, self.replication, "2", self.subset
-                )
-                for output in stage_2[0].outputs:
-                    assigned_cats = [
-                        cat.category_name
-                        for cat in output.parsed.assigned_categories
-                    ]
-                    
-                    window_number = output.parsed.window_number
-                    df_index = df[df["window_number"] == window_number].index
-                    
-                    df.loc[df_index, "assigned_categories"] = str(assigned_cats)
-            self.user = df.to_dict("records")
+                )[0]
+                if stage_2:
+                    df = self.assign_categories(df, stage_2)
+            
+            # Records are produced lazily from the DataFrame (see `iter_user`).
+            self._users = df
         
         return None
     
+    @property
+    def user(self) -> list:
+        """
+        Returns all user prompts (materialized).
+        """
+        return list(self.iter_user())
+    
+    def iter_user(self):
+        """
+        Yields the user prompts. Stage 2 & 3 summary records are produced from
+        the DataFrame a row at a time.
+        """
+        if isinstance(self._users, pd.DataFrame):
+            columns = list(self._users.columns)
+            for row in self._users.itertuples(index=False, name=None):
+                yield dict(zip(columns, row))
+        else:
+            yield from self._users
+    
+    def total_user(self) -> int:
+        """
+        Returns the number of user prompts.
+        """
+        return len(self._users)
+    
+    def serialize_user(self, user: object) -> str:
+        """
+        Returns the user prompt as a string, serializing summary data records
+        in the test's user format.
+        """
+        if isinstance(user, str):
+            return user
+        return records_to_txt(user, self.test_config.user_format)
+    
+    def user_format_report(self):
+        """
+        Returns a DataFrame of the estimated user prompt tokens for each user 
+        format. Savings are relative to the legacy `records` format.
+        """
+        records = [user for user in self.user if not isinstance(user, str)]
+        
+        report = []
+        for user_format in USER_FORMATS:
+            tokens = sum(
+                estimate_tokens(records_to_txt(user, user_format))
+                for user in records
+            )
+            report.append({
+                "stage": self.stage_name,
+                "subset": self.subset,
+                "user_format": user_format,
+                "prompts": len(records),
+                "tokens": tokens
+            })
+        
+        df = pd.DataFrame(report)
+        base_tokens = df.loc[df["user_format"] == "records", "tokens"].iloc[0]
+        df["savings"] = 1 - df["tokens"] / base_tokens if base_tokens else 0.0
+        return df
+    
     def get_prompts(self):
         """
         Returns a list of all prompts.
         
         The total number of prompts should be the following:
             - Stage 0: Length of number of instances in case.
-            - Stage 1: Length of the total number of subsets.
+            - Stage 1: Length of the total number of subsets (times the number
+            of shards, if sharded).
             - Stage 1r: Length of the total number of subsets.
             - Stage 1c: One prompt.
             - Stage 2: Length of number of summaries for case (adjusted for 
@@ -275,6 +483,13 @@ class TestPrompts:
         """
         if self.fixed:
             return None
-        self._construct_system_prompt()
-        self._construct_user_prompt()
-        return [Prompts(system=self.system, user=user) for user in self.user]
\ No newline at end of file
+        return [Prompts(system=self.system, user=user) for user in self.iter_user()]
+    
+    def iter_prompts(self):
+        """
+        Yields the (user, prompts) of each user prompt lazily, where prompts 
+        is the Prompts object w/ the serialized user prompt. Used by the 
+        TestRunner, so a request can be made as each prompt is produced.
+        """
+        for user in self.iter_user():
+            yield user, Prompts(system=self.system, user=self.serialize_user(user))
\ No newline at end of file
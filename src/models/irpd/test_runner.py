@@ -6,11 +6,15 @@ Contains the functional TestRunner model.
 import logging
 from typing import List
 from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 
-from utils import load_json_n_validate, to_list, create_directory
+from utils import load_json_n_validate, validate_json, to_list, create_directory, flush_writes
+from tools.functions import categories_to_txt, output_attrb
 from models.prompts import Prompts
+from models.request_output import RequestOut, MetaOut
 from models.llms.base_llm import BaseLLM
-from models.irpd.output_processer import OutputProcesser
+from models.irpd.meta_writer import meta_writer
+from models.irpd.artifact_worker import artifact_worker
 from models.irpd.test_prompts import TestPrompts
 from models.irpd.test_outputs import TestOutput, TestMeta
 from models.batch_output import BatchOut
@@ -18,10 +22,18 @@ from models.irpd.test_outputs import StageOutput
 from models.irpd.test_config import TestConfig
 from models.irpd.config_manager import ConfigManager
 from models.irpd.output_manager import OutputManager
+from models.irpd.schemas import Stage1rSchema
 
 
 log = logging.getLogger(__name__)
 
+# Maximum number of concurrent requests (e.g., for stage 1 shards).
+MAX_WORKERS = 8
+
+# Maximum number of attempts of a shard or merge request (i.e., retried while 
+# the response is not parsed).
+MAX_ATTEMPTS = 3
+
 
 
 class TestRunner:
@@ -40,7 +52,6 @@ class TestRunner:
         self.config_manager = ConfigManager(test_config)
         self.output_manger = output_manager
         self.print_response = print_response
-        self.processor = OutputProcesser
         self.generate_llm_instance = self.config_manager.generate_llm_instance
         
         self.test_config = test_config
@@ -57,37 +68,41 @@ class TestRunner:
             prompt_id += f"-{user["window_number"]}"
         return prompt_id
         
+    def _test_prompts(self, stage_output: StageOutput):
+        """
+        Returns the TestPrompts object for a StageOutput object.
+        """
+        return TestPrompts(
+            llm_str=stage_output.llm_str,
+            stage_name=stage_output.stage_name,
+            replication=stage_output.replication,
+            subset=stage_output.subset,
+            output_manager=self.output_manger
+        )
+    
+    def _iter_prompts(self, stage_output: StageOutput, test_prompts: TestPrompts):
+        """
+        Yields a tuple for each prompt of a StageOutput object, where the first
+        element is the prompt id, and the second is the Prompts object.
+        """
+        stage = stage_output.stage_name
+        subset = stage_output.subset
+        n = stage_output.replication
+        for user, prompts in test_prompts.iter_prompts():
+            yield self._prompt_id(stage, subset, n, user), prompts
+    
     def _compose_prompts(self, stage_outputs: List[StageOutput]):
         """
-        Returns all prompts for a given stage. For batch completions, this is 
+        Yields all prompts for a given stage. For batch completions, this is 
         the total prompts for a stage for every the replication.
+        
+        Prompts are produced lazily (i.e., data rows to user prompt to 
+        request), so are not all held in memory.
         """
-        aggregated_prompts = []
         for stage_output in stage_outputs:
             # Skipping prompt if StageOutput object is complete.
             if not stage_output.complete:
-                llm_str = stage_output.llm_str
-                stage = stage_output.stage_name
-                subset = stage_output.subset
-                n = stage_output.replication
-                
-                test_prompts = TestPrompts(
-                    llm_str=llm_str,
-                    stage_name=stage,
-                    replication=n,
-                    subset=subset,
-                    output_manager=self.output_manger
-                )
-                
-                # Creating a tuple for each prompt, where the first element is 
-                # the prompt id, and the second is the Prompts object.
-                for prompt in test_prompts.get_prompts():
-                    string_prompt = Prompts(system=str(prompt.system), user=str(prompt.user))
-                    aggregated_prompts.append(
-                        (self._prompt_id(stage, subset, n, prompt.user), string_prompt)
-                    )
-        
-        return aggregated_prompts
+                yield from self._iter_prompts(stage_output, self._test_prompts(stage_output))
     
     def _run_batch(
         self,
@@ -101,8 +116,8 @@ class TestRunner:
         One batch is the requests for the stage for every replication.
         """
         # Structured output schema.
-        schema = self.output_manger.schemas[stage_name]
         llm_str = stage_outputs[0].llm_str
+        schema = self.output_manger.get_schema(llm_str, stage_name)
         
         # Getting prompts.
         agg_prompts = self._compose_prompts(stage_outputs)
@@ -114,7 +129,8 @@ class TestRunner:
         batch_file_path = batches_path / f"stage_{stage_name}_{llm_str}.jsonl"
         
         # Requesting batch if the batch hasn't been requested yet.
-        if not (stage_outputs[0].batch_id and stage_outputs[0].batch_id):
+        batch_id = stage_outputs[0].batch_id
+        if not (batch_id and stage_outputs[0].batch_path):
             # Requesting batch.
             batch_id = llm_instance.request_batch(agg_prompts, schema, batch_file_path)
             
@@ -133,8 +149,10 @@ class TestRunner:
                 stage_output.batch_id = batch_id
                 stage_output.batch_path = batch_file_path
             
-            # Writing meta so that the ID and path are defined.
-            self.processor(stage_outputs, self.config_manager).write_meta()
+            # Writing (& flushing) meta so that the ID and path are defined.
+            self.output_manger.get_processor(
+                llm_str, stage_outputs[0].replication
+            ).write_meta(stage_outputs, flush=True)
         
         # Retrieving batch
         retries = 0
@@ -161,6 +179,204 @@ class TestRunner:
                 break
         return False
     
+    def _request_concurrently(
+        self,
+        prompts: List[Prompts],
+        schema: object,
+        llm_instance: BaseLLM,
+        name: str
+    ) -> List[RequestOut]:
+        """
+        Requests a chat completion for each prompt concurrently. Outputs are 
+        in the same order as the prompts.
+        
+        Failed requests are retried (see `_request_parsed`), so all outputs 
+        are parsed.
+        """
+        workers = min(MAX_WORKERS, len(prompts))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(
+                lambda p: self._request_parsed(p[1], schema, llm_instance, f"{name} {p[0]}"),
+                enumerate(prompts, start=1)
+            ))
+    
+    @staticmethod
+    def _request_parsed(
+        prompts: Prompts,
+        schema: object,
+        llm_instance: BaseLLM,
+        name: str
+    ) -> RequestOut:
+        """
+        Requests a chat completion, retrying if the request failed (i.e., the
+        response was not parsed). Raises a ValueError if all attempts fail.
+        """
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            output = llm_instance.request(prompts, schema)
+            if output is not None and output.parsed is not None:
+                return output
+            log.warning(f"{name} failed (attempt {attempt} of {MAX_ATTEMPTS}).")
+        raise ValueError(f"{name} failed after {MAX_ATTEMPTS} attempts.")
+    
+    @staticmethod
+    def _merge_prompt(system: str, outputs: List[RequestOut]):
+        """
+        Returns the prompt to merge the categories of (parsed) outputs.
+        """
+        user = "".join(
+            categories_to_txt(output_attrb(output.parsed)) for output in outputs
+        )
+        return Prompts(system=system, user=user)
+    
+    @staticmethod
+    def _aggregate_output(
+        parsed: object,
+        prompts: Prompts,
+        outputs: List[RequestOut]
+    ):
+        """
+        Returns a RequestOut object w/ the tokens of all outputs (w/ meta).
+        """
+        metas = [output.meta for output in outputs if output.meta]
+        return RequestOut(
+            parsed=parsed,
+            prompts=prompts,
+            meta=MetaOut(
+                input_tokens=sum(meta.input_tokens for meta in metas),
+                output_tokens=sum(meta.output_tokens for meta in metas)
+            )
+        )
+    
+    def _run_shards(
+        self,
+        stage_output: StageOutput,
+        agg_prompts: List[tuple],
+        llm_instance: BaseLLM
+    ):
+        """
+        Requests stage 1 categories for each shard of a subset concurrently, 
+        then merges the shard categories w/ a stage 1r (refinement) prompt.
+        
+        Each shard output is journaled as it arrives, so finished shards are
+        replayed (by user prompt) instead of re-requested. Failed shard & merge
+        requests are retried, & raise a ValueError if all attempts fail.
+        
+        Returns the merged RequestOut object, w/ the tokens of all requests.
+        """
+        llm_str = stage_output.llm_str
+        n = stage_output.replication
+        subset = stage_output.subset
+        schema = self.output_manger.schemas["1"]
+        
+        replayed = {
+            output.prompts.user: output
+            for output in self.output_manger.get_shard_outputs(stage_output)
+        }
+        
+        def request_shard(shard: tuple):
+            idx, prompts = shard
+            if prompts.user in replayed:
+                return replayed[prompts.user]
+            output = self._request_parsed(
+                prompts, schema, llm_instance, f"Stage 1 subset {subset} shard {idx}"
+            )
+            self.output_manger.journal_shard(stage_output, output)
+            return output
+        
+        log.info(
+            f"\n Requesting shards for:"
+            f"\n\t config: {self.test_config.id}"
+            f"\n\t case: {self.test_config.case}"
+            f"\n\t llm: {llm_str}"
+            f"\n\t replicate: {n} of {self.test_config.total_replications}"
+            f"\n\t stage: 1"
+            f"\n\t subset: {subset}"
+            f"\n\t shards: {len(agg_prompts)}"
+            f"\n\t replayed: {len(replayed)}"
+        )
+        shards = [(idx, prompts) for idx, (_, prompts) in enumerate(agg_prompts, start=1)]
+        workers = min(MAX_WORKERS, len(shards))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            shard_outputs = list(executor.map(request_shard, shards))
+        
+        # Merging shard categories w/ the stage 1r system prompt.
+        merge_system = TestPrompts(
+            llm_str=llm_str,
+            stage_name="1r",
+            replication=n,
+            subset=subset,
+            output_manager=self.output_manger
+        ).system
+        merge_prompts = self._merge_prompt(merge_system, shard_outputs)
+        merged = self._request_parsed(
+            merge_prompts, Stage1rSchema, llm_instance, f"Stage 1 subset {subset} shard merge"
+        )
+        
+        return self._aggregate_output(
+            validate_json({"categories": output_attrb(merged.parsed)}, schema),
+            merge_prompts,
+            shard_outputs + [merged]
+        )
+    
+    def _run_merge_tree(
+        self,
+        stage_output: StageOutput,
+        category_sets: List[RequestOut],
+        system: str,
+        llm_instance: BaseLLM
+    ):
+        """
+        Merges stage 1r category sets into the stage 1c categories via a 
+        tree reduction. Category sets are merged pairwise (w/ the stage 1c 
+        system prompt), each level of the tree requested concurrently.
+        
+        Failed merges are retried, & raise a ValueError if all attempts fail 
+        (as does an unparsed stage 1r category set), so a failed merge is 
+        never carried to the next level.
+        
+        Returns the final merged RequestOut object, w/ the tokens of all 
+        requests.
+        """
+        schema = self.output_manger.schemas["1c"]
+        
+        if any(output.parsed is None for output in category_sets):
+            raise ValueError(
+                f"Stage 1c merge tree has an unparsed stage 1r category set"
+                f" (llm {stage_output.llm_str}, replication {stage_output.replication})."
+            )
+        
+        level = category_sets
+        all_outputs = []
+        depth = 1
+        while len(level) > 1:
+            pairs = [level[i:i + 2] for i in range(0, len(level), 2)]
+            
+            # An unpaired category set is carried to the next level.
+            carried = pairs.pop() if len(pairs[-1]) == 1 else []
+            
+            log.info(
+                f"\n Requesting merge tree level for:"
+                f"\n\t config: {self.test_config.id}"
+                f"\n\t case: {self.test_config.case}"
+                f"\n\t llm: {stage_output.llm_str}"
+                f"\n\t replicate: {stage_output.replication} of {self.test_config.total_replications}"
+                f"\n\t stage: 1c"
+                f"\n\t level: {depth}"
+                f"\n\t merges: {len(pairs)}"
+            )
+            merge_prompts = [self._merge_prompt(system, pair) for pair in pairs]
+            merged = self._request_concurrently(
+                merge_prompts, schema, llm_instance, f"Stage 1c merge tree level {depth} merge"
+            )
+            all_outputs += merged
+            
+            level = merged + carried
+            depth += 1
+        
+        return self._aggregate_output(
+            level[0].parsed, level[0].prompts, all_outputs
+        )
+    
     def _run_completions(
         self,
         stage_name: str,
@@ -172,48 +388,102 @@ class TestRunner:
         
         Includes all StageOutputs across all replications.
         """
+        for stage_output in stage_outputs:
+            self.run_stage_output(stage_name, stage_output, llm_instance)
+        return True
+    
+    def run_stage_output(
+        self,
+        stage_name: str,
+        stage_output: StageOutput,
+        llm_instance: BaseLLM
+    ):
+        """
+        Requests the chat completion(s) for a StageOutput object & stores the 
+        outputs.
+        
+        Used by `_run_completions` & the TestScheduler (for each node).
+        """
+        llm_str = stage_output.llm_str
+        replication = stage_output.replication
+        subset = stage_output.subset
+        
         # Structured output schema.
-        schema = self.output_manger.schemas[stage_name]
+        schema = self.output_manger.get_schema(llm_str, stage_name, replication)
+        self.output_manger.load_outputs(stage_output)
         
-        for stage_output in stage_outputs:
-            llm_str = stage_output.llm_str
-            replication = stage_output.replication
-            subset = stage_output.subset
-            
-            agg_prompts = self._compose_prompts(to_list(stage_output))
-            
-            # Revalidating whether a StageOutput is complete. Because when 
-            # storing completed requests in the initialization of the 
-            # OutputManager, its not necessarily true that it was all outputs 
-            # (e.g., could have missed a subset or summary classifications).
-            if len(agg_prompts) == len(stage_output.outputs) or not agg_prompts:
-                stage_output.complete = True
-                self.output_manger.store_completion(stage_output, stage_output.outputs)
-                self.output_manger.write_output(stage_output)
-                continue
-            else:
-                stage_output.complete = False
-            
-            # Requests made for each prompt (accounts for iterative stages).
-            outputs = []
-            for p in agg_prompts:
-                _, prompts = p
-                
-                log.info(
-                    f"\n Requesting completion for:"
-                    f"\n\t config: {self.test_config.id}"
-                    f"\n\t case: {self.test_config.case}"
-                    f"\n\t llm: {llm_str}"
-                    f"\n\t replicate: {replication} of {self.test_config.total_replications}"
-                    f"\n\t stage: {stage_name}"
-                    f"\n\t subset: {subset}"
-                    f"\n\t prompt: {len(outputs) + 1} of {len(agg_prompts)}"
-                )
-                outputs.append(llm_instance.request(prompts, schema))
-            
-            # Storing & writing outputs.
+        test_prompts = None if stage_output.complete else self._test_prompts(stage_output)
+        total_user = test_prompts.total_user() if test_prompts else 0
+        
+        # Revalidating whether a StageOutput is complete. Because when 
+        # storing completed requests in the initialization of the 
+        # OutputManager, its not necessarily true that it was all outputs 
+        # (e.g., could have missed a subset or summary classifications).
+        # Note: Sharded stage 1 subsets have a single (merged) output. Stage 2
+        # & 3 user prompts exclude completed windows, so are complete only if
+        # none remain.
+        if stage_name in {"2", "3"}:
+            complete = not total_user
+        else:
+            total_prompts = 1 if stage_name == "1" else total_user
+            complete = total_prompts == len(stage_output.outputs) or not total_user
+        if complete:
+            self.output_manger.store_completion(stage_output, stage_output.outputs)
+            return True
+        else:
+            stage_output.complete = False
+        
+        # Prompts are produced lazily, as requested.
+        agg_prompts = self._iter_prompts(stage_output, test_prompts)
+        
+        # Stage 1 shards are merged into one output.
+        if stage_name == "1" and total_user > 1:
+            outputs = [self._run_shards(stage_output, list(agg_prompts), llm_instance)]
             stage_output.outputs = outputs
             self.output_manger.store_completion(stage_output, outputs)
+            return True
+        
+        # Stage 1c merge tree, only when more than two category sets (i.e., 
+        # when the tree differs from the single prompt).
+        if stage_name == "1c" and self.test_config.tree_merge:
+            category_sets = [
+                outputs[0]
+                for outputs in self.output_manger.read_outputs(llm_str, replication, "1r")
+                if outputs
+            ]
+            if len(category_sets) > 2:
+                system = test_prompts.system
+                outputs = [self._run_merge_tree(
+                    stage_output, category_sets, system, llm_instance
+                )]
+                stage_output.outputs = outputs
+                self.output_manger.store_completion(stage_output, outputs)
+                return True
+        
+        # Requests made for each prompt (accounts for iterative stages). Each
+        # output is journaled as it arrives, & appended to any outputs replayed
+        # from the journal.
+        outputs = list(stage_output.outputs)
+        for idx, p in enumerate(agg_prompts, start=1):
+            _, prompts = p
+            
+            log.info(
+                f"\n Requesting completion for:"
+                f"\n\t config: {self.test_config.id}"
+                f"\n\t case: {self.test_config.case}"
+                f"\n\t llm: {llm_str}"
+                f"\n\t replicate: {replication} of {self.test_config.total_replications}"
+                f"\n\t stage: {stage_name}"
+                f"\n\t subset: {subset}"
+                f"\n\t prompt: {idx} of {total_user}"
+            )
+            output = llm_instance.request(prompts, schema)
+            self.output_manger.journal_output(stage_output, output)
+            outputs.append(output)
+        
+        # Storing & writing outputs.
+        stage_output.outputs = outputs
+        self.output_manger.store_completion(stage_output, outputs)
         return True
     
     def run(self):
@@ -232,24 +502,33 @@ class TestRunner:
             for stage_name in self.stages:
                 # Getting all StageOutputs for a given LLM and stage.
                 stage_outputs: List[StageOutput] = self.output_manger.retrieve(
-                    llm_str=llm_str, stage_name=stage_name
+                    llm_str=llm_str, stage_name=stage_name, load=False
                 )
                 
                 # Checking whether the stage has already been complete for the 
-                # given LLM and stage.
+                # given LLM and stage. Outputs are only loaded if not.
                 if not all(output.complete for output in stage_outputs):
+                    self.output_manger.load_outputs(stage_outputs)
+                    
                     # Just because a TestConfig is specified for `batches`, not 
-                    # all LLMs support batches. This adjusts for that.
-                    if self.test_config.batches and llm_instance.batches:
+                    # all LLMs support batches. This adjusts for that. Sharded
+                    # stage 1 & stage 1c merge trees are always run via 
+                    # completions.
+                    completions_only = (
+                        (stage_name == "1" and self.test_config.shard_tokens)
+                        or (stage_name == "1c" and self.test_config.tree_merge)
+                    )
+                    if self.test_config.batches and llm_instance.batches and not completions_only:
                         complete = self._run_batch(
-                            stage_outputs, stage_name, llm_instance
+                            stage_name, stage_outputs, llm_instance
                         )
                     else:
                         if self.test_config.batches: log.info(
-                            f"Note that {llm_str} does not support batches."
+                            f"Note that {llm_str} does not support batches"
+                            " (or stage is requested concurrently)."
                         )
                         complete = self._run_completions(
-                            stage_outputs, stage_name, llm_instance
+                            stage_name, stage_outputs, llm_instance
                         )
                     if not complete: break
             
@@ -257,4 +536,7 @@ class TestRunner:
             test_output.check_test_complete()
             self.output_manger.test_outputs[llm_str] = test_output
         
+        meta_writer.flush()
+        flush_writes()
+        artifact_worker.wait()
         return self.output_manger
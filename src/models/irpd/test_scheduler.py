@@ -0,0 +1,260 @@
+"""
+Test scheduler module.
+
+Contains the StageNode dataclass & the functional TestScheduler model.
+"""
+import heapq
+import logging
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+
+from utils import flush_writes
+from models.llm_model import LLMModel
+from models.llms.base_llm import BaseLLM
+from models.irpd.test_config import TestConfig
+from models.irpd.test_runner import TestRunner
+from models.irpd.output_manager import OutputManager
+from models.irpd.meta_writer import meta_writer
+from models.irpd.artifact_worker import artifact_worker
+from models.irpd.test_outputs import StageOutput
+
+
+log = logging.getLogger(__name__)
+
+# Default maximum number of concurrent nodes per LLM provider.
+DEFAULT_PROVIDER_LIMIT = 4
+
+# Node key: (config id, llm, replication, stage, subset)
+NodeKey = Tuple[str, str, int, str, str]
+
+
+
+@dataclass
+class StageNode:
+    config_id: str
+    stage_output: StageOutput
+    provider: str
+    dependencies: List[NodeKey] = field(default_factory=list)
+    dependents: List[NodeKey] = field(default_factory=list)
+    priority: int = 0
+    
+    @property
+    def key(self) -> NodeKey:
+        return (
+            self.config_id,
+            self.stage_output.llm_str,
+            self.stage_output.replication,
+            self.stage_output.stage_name,
+            self.stage_output.subset
+        )
+
+
+class TestScheduler:
+    """
+    TestScheduler model.
+    
+    Runs test configs as a DAG of StageNodes, where each node is a StageOutput
+    (config, LLM, replication, stage, subset) w/ dependencies on the prior
+    stage (1 -> 1r -> 1c -> 2 -> 3). Ready nodes are run concurrently under
+    per-provider limits, giving priority to nodes on the critical path.
+    
+    Note: Nodes are run via chat completions (not batches).
+    """
+    def __init__(
+        self,
+        test_configs: Dict[str, TestConfig],
+        output_managers: Dict[str, OutputManager],
+        print_response: bool = False,
+        provider_limits: Optional[Dict[str, int]] = None,
+        max_workers: Optional[int] = None
+    ):
+        self.test_configs = test_configs
+        self.output_managers = output_managers
+        self.print_response = print_response
+        self.provider_limits = provider_limits or {}
+        for provider, limit in self.provider_limits.items():
+            assert limit >= 1, f"Provider limit for `{provider}` must be greater than 0."
+        
+        self.runners = {
+            config_id: TestRunner(config, output_managers[config_id], print_response)
+            for config_id, config in test_configs.items()
+        }
+        self._llm_instances: Dict[Tuple[str, str], BaseLLM] = {}
+        self._order = count()
+        
+        self.nodes = self._build_nodes()
+        self._set_priorities()
+        
+        self.max_workers = max_workers or sum(
+            self._provider_limit(provider)
+            for provider in {node.provider for node in self.nodes.values()}
+        ) or 1
+    
+    def _provider_limit(self, provider: str):
+        """
+        Returns the maximum number of concurrent nodes for a provider.
+        """
+        return self.provider_limits.get(provider, DEFAULT_PROVIDER_LIMIT)
+    
+    def _build_nodes(self):
+        """
+        Builds a StageNode for each incomplete StageOutput & sets dependencies.
+        
+        A node depends on the nodes of the prior stage (in the config stages)
+        for the same config, LLM, & replication. Stage 1r nodes only depend on
+        the stage 1 node of the same subset.
+        """
+        nodes: Dict[NodeKey, StageNode] = {}
+        for config_id, config in self.test_configs.items():
+            output_manager = self.output_managers[config_id]
+            for llm_str, test_output in output_manager.test_outputs.items():
+                provider = getattr(LLMModel, llm_str).model_class.name
+                for stage_output in test_output.stage_outputs:
+                    if stage_output.complete:
+                        continue
+                    node = StageNode(config_id, stage_output, provider)
+                    nodes[node.key] = node
+        
+        for node in nodes.values():
+            config_id, llm_str, n, stage_name, subset = node.key
+            stages = self.test_configs[config_id].stages
+            stage_idx = stages.index(stage_name)
+            if stage_idx == 0:
+                continue
+            
+            prior_outputs = self.output_managers[config_id].retrieve(
+                llm_str, n, stages[stage_idx - 1], load=False
+            )
+            prior_keys = [
+                (config_id, llm_str, n, output.stage_name, output.subset)
+                for output in prior_outputs
+            ]
+            if stage_name == "1r":
+                prior_keys = [key for key in prior_keys if key[-1] == subset]
+            for key in prior_keys:
+                # Completed prior StageOutputs are not nodes (not a dependency).
+                if key in nodes:
+                    node.dependencies.append(key)
+                    nodes[key].dependents.append(node.key)
+        return nodes
+    
+    def _set_priorities(self):
+        """
+        Sets the priority of each node as the length of its critical path (the
+        longest chain of dependents).
+        """
+        def critical_path(key: NodeKey) -> int:
+            node = self.nodes[key]
+            if not node.priority:
+                node.priority = 1 + max(
+                    (critical_path(k) for k in node.dependents), default=0
+                )
+            return node.priority
+        
+        for key in self.nodes:
+            critical_path(key)
+        return None
+    
+    def _llm_instance(self, config_id: str, llm_str: str):
+        """
+        Returns the LLM instance for a given config & LLM (created once).
+        """
+        key = (config_id, llm_str)
+        if key not in self._llm_instances:
+            runner = self.runners[config_id]
+            self._llm_instances[key] = runner.generate_llm_instance(
+                llm_str, self.print_response
+            )
+        return self._llm_instances[key]
+    
+    def _run_node(self, node: StageNode):
+        """
+        Runs a node via the TestRunner of its config.
+        """
+        stage_output = node.stage_output
+        llm_instance = self._llm_instance(node.config_id, stage_output.llm_str)
+        return self.runners[node.config_id].run_stage_output(
+            stage_output.stage_name, stage_output, llm_instance
+        )
+    
+    def _skip_dependents(self, key: NodeKey, skipped: set):
+        """
+        Recursively marks the dependents of a failed node as skipped.
+        """
+        for dependent in self.nodes[key].dependents:
+            if dependent not in skipped:
+                skipped.add(dependent)
+                self._skip_dependents(dependent, skipped)
+        return None
+    
+    def run(self):
+        """
+        Runs all nodes. Returns the dictionary of OutputManagers.
+        """
+        remaining = {key: len(node.dependencies) for key, node in self.nodes.items()}
+        running: Dict[Future, StageNode] = {}
+        provider_running: Dict[str, int] = {}
+        skipped: set = set()
+        
+        # Ready nodes are in a heap ordered by (longest) critical path.
+        ready = [
+            (-node.priority, next(self._order), key)
+            for key, node in self.nodes.items()
+            if not node.dependencies
+        ]
+        heapq.heapify(ready)
+        
+        log.info(
+            f"\nScheduling {len(self.nodes)} nodes for {len(self.test_configs)}"
+            f" configs w/ {self.max_workers} workers."
+        )
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while ready or running:
+                # Submitting ready nodes, while their provider has capacity.
+                deferred = []
+                while ready:
+                    item = heapq.heappop(ready)
+                    node = self.nodes[item[2]]
+                    if provider_running.get(node.provider, 0) >= self._provider_limit(node.provider):
+                        deferred.append(item)
+                        continue
+                    provider_running[node.provider] = provider_running.get(node.provider, 0) + 1
+                    running[executor.submit(self._run_node, node)] = node
+                for item in deferred:
+                    heapq.heappush(ready, item)
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    provider_running[node.provider] -= 1
+                    
+                    if future.exception() or not future.result():
+                        log.error(
+                            f"Node {node.key} failed: {future.exception()}."
+                            " Skipping dependent nodes."
+                        )
+                        self._skip_dependents(node.key, skipped)
+                        continue
+                    
+                    for dependent in node.dependents:
+                        remaining[dependent] -= 1
+                        if not remaining[dependent] and dependent not in skipped:
+                            heapq.heappush(ready, (
+                                -self.nodes[dependent].priority,
+                                next(self._order),
+                                dependent
+                            ))
+        
+        if skipped:
+            log.warning(f"{len(skipped)} nodes were skipped.")
+        
+        # Re-checking whether each TestOutput object is complete.
+        for output_manager in self.output_managers.values():
+            for test_output in output_manager.test_outputs.values():
+                test_output.check_test_complete()
+        meta_writer.flush()
+        flush_writes()
+        artifact_worker.wait()
+        return self.output_managers
@@ -101,6 +101,53 @@ class IRPDTestClass(TestClassContainer, Enum):
             kwargs:
                 - prompts_path, output_path: The paths to be used for outputs
                 and/or prompts.
+                - category_ids: If True, stage 2 & 3 outputs reference the 
+                stage 1c categories by an enumerated ID instead of the category
+                name. Defaults to False.
+                - reasoning: If False, stage 2 & 3 outputs do not include the
+                reasoning field (fast mode). Defaults to True.
+                - user_format: The format of summary data in 
+                user prompts. Can be from ["records", "csv", "tsv", "json", 
+                "abbrev"]. Defaults to "records".
+                - max_examples: The number of examples for each category in
+                stage 2 & 3 system prompts (0 for definitions only). Defaults
+                to None (all examples).
+                - max_reasoning_chars: The number of characters the reasoning
+                of category examples are truncated to in stage 2 & 3 system 
+                prompts. Defaults to None (no truncation).
+                - shard_tokens: The (estimated) token budget of stage 1 user
+                prompts. If the summary data of a subset exceeds the budget, it
+                is split into shards that are run concurrently & merged w/ a 
+                stage 1r prompt. Defaults to None (no sharding).
+                - tree_merge: If True, stage 1c merges the stage 1r category 
+                sets pairwise, one concurrent level at a time, instead of in a
+                single prompt. Defaults to False.
+                - export_only: If True, the final form outputs (category PDFs
+                & classification CSVs) are only built on `export`, instead of
+                in the background when a stage completes. Defaults to False.
+                - packed: If True, the prompts & responses of each stage 
+                subset are written to a single SQLite file (indexed on window
+                number), instead of a file for each window. See 
+                `OutputManager.export_legacy_layout`. Defaults to False.
+                - prompt_blobs: If True, prompts are stored once in a 
+                content-addressed (compressed) blob store shared by the tests,
+                & referenced from the subset manifests, instead of written to 
+                each subset's prompts dir. Defaults to False.
+                - parsed_only: If True, only the parsed responses (& meta) of
+                outputs are kept in memory once written (i.e., prompts are 
+                dropped). Defaults to False.
+                - hot_stages: The maximum number of complete stages (i.e., an 
+                LLM, replication, & stage) of a test config kept in memory (a
+                single LRU across the LLMs & replications of the config). The
+                least recently used are evicted to disk, & reloaded when 
+                retrieved. If None, all are kept. Defaults to None.
+                - data_cache: If True (& pyarrow is installed), a Parquet copy
+                of each data CSV is cached in the test dir. (not the data dir.),
+                & read on later runs. Defaults to False.
+                - read_only: If True, the test paths are not written to (i.e.,
+                no manifests, journals, or dirs. are written, & batches are not
+                checked), so tests can only be planned (see `plan`), not run.
+                Defaults to False.
         """
         # Adjust stages only for Test and Subtest models.
         if self in {IRPDTestClass.TEST, IRPDTestClass.SUBTEST}:
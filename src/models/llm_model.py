@@ -148,6 +148,17 @@ class LLMModel(LLMModelContainer, Enum):
         LLMModelClass.MISTRAL
     )
     
+    def get_configs(self, config: str = "base"):
+        """
+        Returns the validated configs of a LLM model (w/o creating an instance).
+        
+        Args:
+            config (str, optional): The config used for LLM model. Defaults to 
+            "base".
+        """
+        _, model_configs = self.model_class.impl
+        return validate_json(CONFIGS[config][self.key], model_configs)
+    
     def get_llm_instance(
         self,
         config: str = "base",
@@ -162,11 +173,8 @@ class LLMModel(LLMModelContainer, Enum):
             print_response (bool, optional): If True, prints response of all
             LLM requests. Defaults to False.
         """
-        model_class, model_configs = self.model_class.impl
-        config_json = validate_json(
-            CONFIGS[config][self.key],
-            model_configs
-        )
+        model_class, _ = self.model_class.impl
+        config_json = self.get_configs(config)
         return model_class(
             api_key=get_env_var(self.api_key),
             model=self.model_name,
@@ -6,7 +6,6 @@ Contains the AnthropicClient model.
 
 import logging
 import time
-import json
 import random as r
 from pathlib import Path
 from typing import List, Optional
@@ -17,7 +16,7 @@ from anthropic.types.messages.batch_create_params import Request
 from anthropic.types.message import Message
 from pydantic import BaseModel
 
-from utils import write_jsonl, load_jsonl
+from utils import write_jsonl, load_jsonl, json_loads
 from models.batch_output import BatchOut, BatchResponse
 from models.prompts import Prompts
 from models.llms.base_llm import BaseLLM
@@ -104,7 +103,7 @@ class AnthropicClient(BaseLLM):
             responses=[]
         )
         for response in batch_output_file:
-            response_json = json.loads(response)
+            response_json = json_loads(response)
             response_id = response_json["custom_id"]
             
             # Matching request prompts to response (if spceified)
@@ -15,7 +15,7 @@ from openai import APIConnectionError, APITimeoutError, RateLimitError
 from openai.types.chat import ChatCompletion
 from openai.lib._parsing._completions import type_to_response_format_param
 
-from utils import write_jsonl, load_jsonl
+from utils import write_jsonl, iter_jsonl, json_loads
 from models.batch_output import BatchOut, BatchResponse
 from models.prompts import Prompts
 from models.llms.base_llm import BaseLLM
@@ -71,7 +71,7 @@ class OpenAIClient(BaseLLM):
         messages: List[Tuple[str, Prompts]],
         schema: BaseModel = None
     ):
-        batch = []
+        # Batch inputs are yielded, so are streamed to the batch file.
         for message_id, message in messages:
             user = message.user
             system = message.system
@@ -79,8 +79,7 @@ class OpenAIClient(BaseLLM):
             schema = type_to_response_format_param(schema)
             request_load = self._request_load(user, system, schema)
             batch_input.update({"body": request_load})
-            batch.append(batch_input)
-        return batch
+            yield batch_input
     
     def retreive_batch(
         self,
@@ -108,22 +107,22 @@ class OpenAIClient(BaseLLM):
             return "failed"
         
         batch_output_file = client.files.content(file_id=batch.output_file_id).iter_lines()
-        batch_input_file = load_jsonl(batch_file_path) if batch_file_path else None
+        # Batch file prompts indexed by request ID.
+        batch_input_file = {
+            p["custom_id"]: p["body"]["messages"] for p in iter_jsonl(batch_file_path)
+        } if batch_file_path else None
         
         batch_output = BatchOut(
             batch_id=batch_id,
             responses=[]
         )
         for response in batch_output_file:
-            response_json = json.loads(response)
+            response_json = json_loads(response)
             response_id = response_json["custom_id"]
             
             # Mathces prompts from batch file to responses in batch by request ID.
             if batch_input_file:
-                prompts = next((
-                    p["body"]["messages"] 
-                    for p in batch_input_file if p["custom_id"] == response_id
-                ))
+                prompts = batch_input_file[response_id]
                 system = next((p["content"] for p in prompts if p["role"] != "user"))
                 user = next((p["content"] for p in prompts if p["role"] == "user"))
             else:
@@ -1,9 +1,17 @@
 """
 Module for Prompts object.
 """
-from pydantic import BaseModel
+import sys
+from pydantic import BaseModel, field_validator
 
 
 class Prompts(BaseModel):
     system: str
-    user: object
\ No newline at end of file
+    user: object
+    
+    @field_validator("system")
+    @classmethod
+    def intern_system(cls, system: str) -> str:
+        # The system prompt is (mostly) static across requests, so a single 
+        # copy is shared by all Prompts objects.
+        return sys.intern(system)
\ No newline at end of file
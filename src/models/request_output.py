@@ -1,16 +1,16 @@
 """
 Module for RequestOut and MetaOut models.
 """
-import json
 from datetime import datetime
 from dataclasses import dataclass
 from pydantic import BaseModel
 
+from utils import json_dumps
 from models.prompts import Prompts
 
 
 
-@dataclass
+@dataclass(slots=True)
 class MetaOut:
     input_tokens: int
     output_tokens: int
@@ -25,15 +25,50 @@ class MetaOut:
             self.created = int(datetime.now().timestamp())
 
 
-@dataclass
 class RequestOut:
-    text: str = None
-    parsed: BaseModel = None
-    prompts: Prompts = None
-    meta: MetaOut = None
+    """
+    RequestOut model (slotted).
     
-    def __post_init__(self):
-        # If RequestOut object initialized w/ structured output, text field
-        # is filled.
-        if self.parsed and not self.text:
-            self.text = json.dumps(self.parsed.model_dump(), indent=4)
\ No newline at end of file
+    The text field is the raw response, if given. Otherwise, it is computed 
+    from the parsed field when accessed. System prompts are interned (see 
+    Prompts), so are shared across outputs.
+    """
+    __slots__ = ("_text", "parsed", "prompts", "meta")
+    
+    def __init__(
+        self,
+        text: str = None,
+        parsed: BaseModel = None,
+        prompts: Prompts = None,
+        meta: MetaOut = None
+    ):
+        self._text = text
+        self.parsed = parsed
+        self.prompts = prompts
+        self.meta = meta
+    
+    @property
+    def text(self) -> str:
+        if self._text is None and self.parsed is not None:
+            return json_dumps(self.parsed.model_dump(), indent=4)
+        return self._text
+    
+    @text.setter
+    def text(self, text: str):
+        self._text = text
+    
+    def drop_prompts(self):
+        """
+        Drops the prompts (& raw text) of the output, so only the parsed 
+        response (& meta) is kept in memory.
+        """
+        self.prompts = None
+        if self.parsed is not None:
+            self._text = None
+        return None
+    
+    def __repr__(self):
+        return (
+            f"RequestOut(text={self.text!r}, parsed={self.parsed!r},"
+            f" prompts={self.prompts!r}, meta={self.meta!r})"
+        )
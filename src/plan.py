@@ -0,0 +1,115 @@
+"""
+Plan module.
+
+Command line equivalent of `IRPDBase.plan`. Prints the estimated requests,
+tokens, cost & wall time of a test (w/o requesting any prompts). The test is
+initialized read only, so the test paths are not written to.
+
+Example:
+    python src/plan.py --test-type intra_model --cases uni --ras both \
+        --treatments imperfect --stages 1 1r 1c 2 3 -N 3 \
+        --llms GPT_4O_1120 --concurrency 4 --rpm 500
+"""
+import argparse
+import logging
+
+import pandas as pd
+
+from logger import LoggerManager
+from models.irpd_model import IRPDTestClass, DEFAULTS
+
+
+log = logging.getLogger("app")
+
+
+
+def parse_args():
+    """
+    Returns the parsed command line args.
+    """
+    parser = argparse.ArgumentParser(description="Plans (dry runs) an IRPD test.")
+    parser.add_argument("--test-type", default="test", choices=[t.name.lower() for t in IRPDTestClass])
+    parser.add_argument("--cases", nargs="+", required=True)
+    parser.add_argument("--ras", nargs="+", required=True)
+    parser.add_argument("--treatments", nargs="+", required=True)
+    parser.add_argument("--stages", nargs="+", required=True)
+    parser.add_argument("-N", type=int, default=1)
+    parser.add_argument("--llms", nargs="+", default=DEFAULTS["llms"])
+    parser.add_argument("--llm-configs", nargs="+", default=DEFAULTS["llm_configs"])
+    parser.add_argument("--max-instances", type=int)
+    parser.add_argument("--batch", action="store_true")
+    parser.add_argument("--test-paths", nargs="+")
+    parser.add_argument("--output-path")
+    parser.add_argument("--prompts-path")
+    parser.add_argument("--data-path")
+    parser.add_argument("--user-format", default="records")
+    parser.add_argument("--category-ids", action="store_true")
+    parser.add_argument("--no-reasoning", action="store_true")
+    parser.add_argument("--max-examples", type=int)
+    parser.add_argument("--max-reasoning-chars", type=int)
+    parser.add_argument("--shard-tokens", type=int)
+    parser.add_argument("--tree-merge", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--rpm", type=int, help="Request rate limit per LLM.")
+    parser.add_argument("--tpm", type=int, help="Token rate limit per LLM.")
+    parser.add_argument(
+        "--output-tokens",
+        nargs="+",
+        default=[],
+        metavar="STAGE=TOKENS",
+        help="Output tokens per request for stages (e.g., 2=150)."
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    log_manager = LoggerManager()
+    log_manager.setup_logger()
+    
+    # Paths not specified are taken from the env. variables.
+    paths = {
+        "output_path": args.output_path,
+        "prompts_path": args.prompts_path,
+        "data_path": args.data_path
+    }
+    irpd_test = IRPDTestClass[args.test_type.upper()].get_irpd_instance(
+        cases=args.cases,
+        ras=args.ras,
+        treatments=args.treatments,
+        stages=args.stages,
+        N=args.N,
+        llms=args.llms,
+        llm_configs=args.llm_configs,
+        max_instances=args.max_instances,
+        batch=args.batch,
+        test_paths=args.test_paths,
+        user_format=args.user_format,
+        category_ids=args.category_ids,
+        reasoning=not args.no_reasoning,
+        max_examples=args.max_examples,
+        max_reasoning_chars=args.max_reasoning_chars,
+        shard_tokens=args.shard_tokens,
+        tree_merge=args.tree_merge,
+        read_only=True,
+        **{k: v for k, v in paths.items() if v}
+    )
+    
+    output_tokens = dict(arg.split("=", 1) for arg in args.output_tokens)
+    df = irpd_test.plan(
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        output_tokens={k: int(v) for k, v in output_tokens.items()}
+    )
+    
+    with pd.option_context("display.width", None, "display.max_columns", None):
+        print(df.to_string(index=False))
+    print(
+        f"\nTotal:"
+        f"\n\t requests: {df['requests'].sum()}"
+        f"\n\t input_tokens: {df['input_tokens'].sum()}"
+        f"\n\t output_tokens: {df['output_tokens'].sum()}"
+        f"\n\t cost: ${df['cost'].sum():.2f}"
+        f"\n\t wall_seconds: {df['wall_seconds'].sum():.0f} (excl. batches)"
+    )
@@ -0,0 +1,267 @@
+"""
+Benchmarks module.
+
+Contains benchmarks for the IRPD output pipeline. Run on a temporary (or 
+scratch) test path, as outputs are written. The concurrency stress test is
+in the test suite (see `tests/test_output_manager.py`).
+"""
+import json
+import logging
+import tracemalloc
+import pandas as pd
+from pathlib import Path
+from typing import List
+from time import perf_counter
+
+from utils import iter_jsonl, json_loads, json_dumps, JSON_BACKEND
+from models.prompts import Prompts
+from models.request_output import RequestOut, MetaOut
+from models.irpd.schemas import Stage1Schema, Stage2Schema
+from models.irpd.test_config import TestConfig
+from models.irpd.output_manager import OutputManager
+from models.irpd.test_prompts import TestPrompts
+
+
+log = logging.getLogger(__name__)
+
+
+
+def _stage_1_output(subset: str):
+    """
+    Returns a synthetic Stage 1 RequestOut object.
+    """
+    parsed = Stage1Schema.model_validate({"categories": [{
+        "category_name": f"{subset} category",
+        "definition": "Synthetic category.",
+        "examples": [{"window_number": 1, "reasoning": "Synthetic reasoning."}]
+    }]})
+    return RequestOut(
+        parsed=parsed,
+        prompts=Prompts(system="system", user=subset),
+        meta=MetaOut(input_tokens=10, output_tokens=5)
+    )
+
+
+def _stage_2_output(window_number: int):
+    """
+    Returns a synthetic Stage 2 RequestOut object.
+    """
+    parsed = Stage2Schema.model_validate({
+        "window_number": window_number,
+        "assigned_categories": [{"category_name": "category"}],
+        "reasoning": "Synthetic reasoning."
+    })
+    return RequestOut(
+        parsed=parsed,
+        prompts=Prompts(system="system", user=str(window_number)),
+        meta=MetaOut(input_tokens=10, output_tokens=5)
+    )
+
+
+def _test_config(
+    test_path: Path,
+    llm_str: str,
+    llm_config: str,
+    stages: List[str],
+    replications: int
+):
+    """
+    Returns a TestConfig for benchmarks (uni case).
+    """
+    return TestConfig(
+        case="uni",
+        ra="both",
+        treatment="imperfect",
+        llms=[llm_str],
+        llm_config=llm_config,
+        test_type="test",
+        test_path=Path(test_path),
+        data_path=Path(test_path),
+        prompts_path=Path(test_path),
+        stages=stages,
+        batches=False,
+        total_replications=replications,
+        cases=["uni"],
+        id="benchmark"
+    )
+
+
+def benchmark_store_overhead(
+    test_path: Path,
+    llm_str: str = "GPT_4O_1120",
+    llm_config: str = "base",
+    stores: int = 100
+):
+    """
+    Benchmarks the per-store overhead of writing outputs. Compares building an 
+    LLM client (as OutputProcessers did for each store) to the lookup of the 
+    reused OutputProcesser of a subpath, & times a full store (w/o final 
+    forms). Returns a dictionary of the mean seconds per store.
+    """
+    output_manager = OutputManager(
+        _test_config(test_path, llm_str, llm_config, ["1"], 1)
+    )
+    stage_output = output_manager.retrieve(llm_str, 1, "1", "full")[0]
+    output = _stage_1_output("full")
+    
+    start = perf_counter()
+    for _ in range(stores):
+        output_manager.config_manager.generate_llm_instance(llm_str)
+    client = (perf_counter() - start) / stores
+    
+    start = perf_counter()
+    for _ in range(stores):
+        output_manager.get_processor(llm_str, 1)
+    processor = (perf_counter() - start) / stores
+    
+    start = perf_counter()
+    for _ in range(stores):
+        # Rewriting the same (incomplete) subset for each store.
+        stage_output.complete = False
+        output_manager.store_completion(stage_output, output)
+    store = (perf_counter() - start) / stores
+    
+    results = {
+        "llm_client_seconds": client,
+        "reused_processor_seconds": processor,
+        "store_seconds": store
+    }
+    log.info(
+        f"\nStore overhead benchmark ({stores} stores):"
+        f"\n\t llm client: {client * 1e3:.3f} ms"
+        f"\n\t reused processor: {processor * 1e3:.3f} ms"
+        f"\n\t store: {store * 1e3:.3f} ms"
+    )
+    return results
+
+
+def benchmark_json_backend(test_path: Path, files: int = 3, repeats: int = 3):
+    """
+    Benchmarks the JSON backend (see `utils.JSON_BACKEND`) against the stdlib
+    on the largest batch files (& journals) in a test dir. Each file is 
+    parsed line by line & re-serialized. Returns a dictionary of the best 
+    seconds per file, for each backend.
+    """
+    paths = sorted(
+        Path(test_path).rglob("*.jsonl"), key=lambda path: path.stat().st_size, reverse=True
+    )[:files]
+    
+    results = {}
+    for path in paths:
+        lines = path.read_bytes().splitlines()
+        objs = list(iter_jsonl(path))
+        timings = {}
+        for backend, loads, dumps in (
+            ("json", json.loads, json.dumps),
+            (JSON_BACKEND, json_loads, json_dumps)
+        ):
+            best = float("inf")
+            for _ in range(repeats):
+                start = perf_counter()
+                for line in lines:
+                    loads(line)
+                for obj in objs:
+                    dumps(obj)
+                best = min(best, perf_counter() - start)
+            timings[backend] = best
+        results[path.name] = timings
+        log.info(
+            f"\nJSON backend benchmark ({path.name}, {len(lines)} lines):"
+            + "".join(f"\n\t {backend}: {secs * 1e3:.3f} ms" for backend, secs in timings.items())
+        )
+    return results
+
+
+def benchmark_request_memory(
+    replications: int = 50,
+    windows: int = 3000,
+    system_chars: int = 10000,
+    user_chars: int = 1000,
+    sample_replications: int = 1
+):
+    """
+    Benchmarks the memory of Stage 2 RequestOut objects (via tracemalloc) for
+    an IntraModel run of `replications` x `windows`. Compares the legacy
+    representation (a system prompt copy & a text copy of the parsed 
+    response in each output), the compact representation (interned system 
+    prompts & lazy text), & parsed only (prompts dropped).
+    
+    Outputs of `sample_replications` are built (each w/ its own system prompt
+    copies, e.g., as parsed from a batch file or journal), & extrapolated to
+    `replications`. Returns a dictionary of the MB for each representation.
+    """
+    def build(mode: str):
+        outputs = []
+        for n in range(sample_replications):
+            for w in range(1, windows + 1):
+                # A new system prompt string for each output.
+                system = "".join(["s" * (system_chars - 1), str(n % 10)])
+                user = "u" * user_chars + str(w)
+                output = _stage_2_output(w)
+                if mode == "legacy":
+                    # Constructed w/o validation (i.e., not interned), w/ text.
+                    output.prompts = Prompts.model_construct(system=system, user=user)
+                    output.text = json.dumps(output.parsed.model_dump(), indent=4)
+                else:
+                    output.prompts = Prompts(system=system, user=user)
+                    if mode == "parsed_only":
+                        output.drop_prompts()
+                outputs.append(output)
+        return outputs
+    
+    results = {}
+    for mode in ("legacy", "compact", "parsed_only"):
+        tracemalloc.start()
+        outputs = build(mode)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del outputs
+        results[f"{mode}_mb"] = current / 2**20 * replications / sample_replications
+    
+    log.info(
+        f"\nRequestOut memory benchmark ({replications} x {windows} windows):"
+        + "".join(f"\n\t {mode}: {mb:,.1f} MB" for mode, mb in results.items())
+    )
+    return results
+
+
+def benchmark_stage_3_join(windows: int = 10000, completed: float = 0.5):
+    """
+    Benchmarks building the Stage 3 summary data (completed windows filtered, 
+    & the Stage 2 assignments joined) for `windows` windows, w/ `completed` 
+    of the windows already classified. Compares the legacy per-window loop 
+    to the vectorized join (& checks both are equal). Returns a dictionary of
+    the seconds of each.
+    """
+    df = pd.DataFrame({
+        "window_number": range(1, windows + 1),
+        "summary_1": ["Synthetic summary."] * windows
+    })
+    stage_2 = [_stage_2_output(w) for w in range(1, windows + 1)]
+    stage_3 = stage_2[:int(windows * completed)]
+    
+    start = perf_counter()
+    legacy = df.copy()
+    window_nums = [output.parsed.window_number for output in stage_3]
+    legacy = legacy[~legacy["window_number"].isin(window_nums)]
+    for output in stage_2:
+        assigned_cats = [cat.category_name for cat in output.parsed.assigned_categories]
+        df_index = legacy[legacy["window_number"] == output.parsed.window_number].index
+        legacy.loc[df_index, "assigned_categories"] = str(assigned_cats)
+    loop = perf_counter() - start
+    
+    start = perf_counter()
+    joined = TestPrompts.assign_categories(TestPrompts.filter_completed(df, stage_3), stage_2)
+    join = perf_counter() - start
+    
+    pd.testing.assert_frame_equal(
+        legacy.reset_index(drop=True), joined.reset_index(drop=True), check_dtype=False
+    )
+    results = {"loop_seconds": loop, "join_seconds": join}
+    log.info(
+        f"\nStage 3 join benchmark ({windows} windows):"
+        f"\n\t loop: {loop:.3f} s"
+        f"\n\t join: {join:.3f} s"
+    )
+    return results
+
@@ -3,32 +3,66 @@ Functions module.
 
 Contains useful functions specific to IRPD testing.
 """
+import csv
+import io
+import math
 import logging
-from typing import List
+from typing import List, Dict, Union
 from pydantic import BaseModel
 
+from utils import to_list, json_dumps
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 
 log = logging.getLogger(__name__)
 
+# Formats for serializing summary data in user prompts.
+USER_FORMATS = ("records", "csv", "tsv", "json", "abbrev")
 
 
-def categories_to_txt(categories: BaseModel) -> str:
+
+def categories_to_txt(
+    categories: BaseModel,
+    category_ids: bool = False,
+    max_examples: int = None,
+    max_reasoning_chars: int = None
+) -> str:
     """
     Function that takes categories, and outputs format for pdf/prompt.
+    
+    If `category_ids` is True, each category header is prefixed w/ its
+    category ID (see `category_id_map`). For compact prompts, `max_examples`
+    keeps only the first k examples of each category (0 for definitions only)
+    & `max_reasoning_chars` truncates the reasoning of each example.
     """
     category_texts = []
-    for category in categories:
+    for cat_idx, category in enumerate(categories, start=1):
+        examples = category.examples
+        if max_examples is not None:
+            examples = examples[:max_examples]
+        
         example_texts = []
-        for idx, example in enumerate(category.examples, start=1):
+        for idx, example in enumerate(examples, start=1):
+            reasoning = example.reasoning
+            if max_reasoning_chars and len(reasoning) > max_reasoning_chars:
+                reasoning = reasoning[:max_reasoning_chars].rstrip() + "..."
             example_texts.append(
                 f"  {idx}. Window number: {example.window_number},"
-                f" Reasoning: {example.reasoning}"
+                f" Reasoning: {reasoning}"
             )
+        header = category.category_name
+        if category_ids:
+            header = f"[{category_id(cat_idx)}] {header}"
         category_text = (
-            f"### {category.category_name}\n\n"
+            f"### {header}\n\n"
             f"**Definition**: {category.definition}\n\n"
-            f"**Examples**:\n\n{"\n".join(example_texts)}\n\n"
         )
+        if example_texts:
+            category_text += f"**Examples**:\n\n{"\n".join(example_texts)}\n\n"
         category_texts.append(category_text)
     return "".join(category_texts)
 
@@ -57,4 +91,108 @@ def output_attrb(output: BaseModel) -> BaseModel:
         return output.assigned_categories
     # Stage 3
     if hasattr(output, "category_ranking"):
-        return output.category_ranking
\ No newline at end of file
+        return output.category_ranking
+
+
+def category_id(idx: int) -> str:
+    """
+    Returns the category ID for a given (1-based) category position.
+    """
+    return f"C{idx}"
+
+
+def category_id_map(categories: List[BaseModel]) -> Dict[str, str]:
+    """
+    Returns a dictionary of category IDs to category names.
+    
+    IDs are positional (e.g., 'C1', 'C2', ...), so are only meaningful w/ 
+    respect to the category set they were generated from.
+    """
+    return {
+        category_id(idx): category.category_name
+        for idx, category in enumerate(categories, start=1)
+    }
+
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Returns the estimated number of tokens in text.
+    
+    Uses the tiktoken `o200k_base` encoding if installed, otherwise a ~4 
+    characters per token heuristic.
+    """
+    if tiktoken:
+        return len(tiktoken.get_encoding("o200k_base").encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def abbreviate_keys(keys: List[str]) -> Dict[str, str]:
+    """
+    Returns a dictionary of keys to abbreviated keys.
+    
+    Abbreviations are the initials of the `_` separated parts of a key, 
+    keeping digits (e.g., 'window_number' -> 'wn', 'summary_ra1' -> 'sr1').
+    """
+    abbrevs = {}
+    for key in keys:
+        parts = [p for p in key.split("_") if p]
+        abbrev = "".join(
+            p[0] + "".join(c for c in p[1:] if c.isdigit()) for p in parts
+        ) or key
+        
+        # Suffixing duplicate abbreviations.
+        base, idx = abbrev, 2
+        while abbrev in abbrevs.values():
+            abbrev = f"{base}{idx}"
+            idx += 1
+        abbrevs[key] = abbrev
+    return abbrevs
+
+
+def records_to_txt(
+    records: Union[dict, List[dict]],
+    user_format: str = "records"
+) -> str:
+    """
+    Function that takes summary data records, and outputs format for prompt.
+    
+    Formats:
+        - records: Python repr of the records (legacy format).
+        - csv, tsv: One header row, then a row for each record.
+        - json: Compact JSON arrays, `{"columns": [...], "rows": [[...]]}`.
+        - abbrev: Compact JSON records w/ abbreviated keys, prefixed w/ a key
+        legend.
+    """
+    if user_format == "records":
+        return str(records)
+    
+    records = to_list(records)
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    
+    if user_format in {"csv", "tsv"}:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(
+            buffer,
+            fieldnames=columns,
+            delimiter="," if user_format == "csv" else "\t",
+            lineterminator="\n"
+        )
+        writer.writeheader()
+        writer.writerows(records)
+        return buffer.getvalue()
+    
+    if user_format == "json":
+        rows = [[record.get(col) for col in columns] for record in records]
+        return json_dumps({"columns": columns, "rows": rows})
+    
+    if user_format == "abbrev":
+        abbrevs = abbreviate_keys(columns)
+        legend = ", ".join(f"{v}={k}" for k, v in abbrevs.items())
+        abbrev_records = [
+            {abbrevs[k]: v for k, v in record.items()} for record in records
+        ]
+        return f"Keys: {legend}\n" + json_dumps(abbrev_records)
+    
+    log.error(f"User format '{user_format}' not in {USER_FORMATS}.")
+    raise ValueError(f"User format '{user_format}' not in {USER_FORMATS}.")
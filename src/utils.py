@@ -4,16 +4,20 @@ Utilities module.
 Contains general functions.
 """
 import os
+import atexit
+import threading
 import subprocess
 import sys
 import re
+import hashlib
 import importlib
 import json
+import math
 import yaml
 import logging
 import configs
 import importlib.resources as pkg_resources
-from typing import List, Union
+from typing import List, Dict, Iterable, Iterator, Union
 from pathlib import Path
 from dotenv import load_dotenv 
 from yaml import YAMLError
@@ -21,9 +25,22 @@ from json import JSONDecodeError
 from markdown_pdf import MarkdownPdf, Section
 from pydantic import BaseModel, ValidationError
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
 
 log = logging.getLogger(__name__)
 
+# JSON backend (fastest installed): "orjson", "msgspec", or "json" (stdlib).
+JSON_BACKEND = "orjson" if orjson else "msgspec" if msgspec else "json"
+
 
 
 def to_list(arg: Union[object, List[object]]):
@@ -112,29 +129,89 @@ def load_config(config: str) -> dict:
         raise
 
 
+def json_loads(data: Union[str, bytes]) -> object:
+    """
+    Returns the JSON object from a JSON string (or bytes) w/ the JSON backend.
+    Raises JSONDecodeError for invalid JSON.
+    """
+    if orjson:
+        return orjson.loads(data)
+    if msgspec:
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as e:
+            raise JSONDecodeError(str(e), str(data), 0) from e
+    return json.loads(data)
+
+
+def _json_finite(obj: object) -> object:
+    """
+    Returns the object w/ non-finite floats (NaN & infinity) replaced w/ None.
+    """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _json_finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_json_finite(value) for value in obj]
+    return obj
+
+
+def json_dumps(obj: object, indent: int = None) -> str:
+    """
+    Returns the JSON string of an object w/ the JSON backend. Compact (no 
+    whitespace) if no indent (orjson only supports an indent of 2, others use
+    msgspec/stdlib).
+    
+    The output is the same for each backend: non-ASCII characters are not 
+    escaped, & NaN & infinity are written as null.
+    """
+    if orjson and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option).decode()
+    if msgspec:
+        data = msgspec.json.encode(obj)
+        return (msgspec.json.format(data, indent=indent) if indent else data).decode()
+    return json.dumps(
+        _json_finite(obj),
+        indent=indent,
+        ensure_ascii=False,
+        separators=None if indent else (",", ":")
+    )
+
+
 def load_json(file_path: Union[str, Path], dumps: bool = False) -> dict | str:
     """
     Returns the JSON object (or string) from a JSON file.
     """
     try:
-        json_data = json.loads(Path(file_path).read_text())
+        json_data = json_loads(Path(file_path).read_bytes())
     except (JSONDecodeError, FileNotFoundError) as e:
         log.error(f"Error loading JSON from {file_path}: {e}")
         raise
-    return json.dumps(json_data) if dumps else json_data
+    return json_dumps(json_data) if dumps else json_data
 
 
-def load_jsonl(file_path: Union[str, Path], dumps: bool = False) -> List[dict] | str:
+def iter_jsonl(file_path: Union[str, Path]) -> Iterator[object]:
     """
-    Returns a list of JSON objects (or a JSON string) from a JSONL file.
+    Yields the JSON objects of a JSONL file (streamed line by line).
     """
     try:
-        with open(Path(file_path), "r") as f:
-            json_data = [json.loads(line) for line in f if line.strip()]
+        with open(Path(file_path), "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield json_loads(line)
     except (JSONDecodeError, FileNotFoundError) as e:
         log.error(f"Error loading JSONL from {file_path}: {e}")
         raise
-    return json.dumps(json_data) if dumps else json_data
+
+
+def load_jsonl(file_path: Union[str, Path], dumps: bool = False) -> List[dict] | str:
+    """
+    Returns a list of JSON objects (or a JSON string) from a JSONL file.
+    """
+    json_data = list(iter_jsonl(file_path))
+    return json_dumps(json_data) if dumps else json_data
 
 
 def validate_json(json_data: dict, schema: BaseModel) -> BaseModel | None:
@@ -189,18 +266,107 @@ def file_to_string(file_path: Union[str, Path]) -> str:
         raise
 
 
+def _atomic_write(path: Path, text: str) -> None:
+    """
+    Writes text to a temporary file (unique to the thread) & then renames it
+    to the path, so the file is never torn.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+class _WriteBehind:
+    """
+    Write-behind queue of file writes, written by a dedicated writer thread.
+    
+    Pending writes are drained & written as a group (atomically, in order),
+    & a pending write to a path is replaced by a later write to the path. 
+    Errors are logged & raised by the next `flush`.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending: Dict[Path, str] = {}
+        self._writing = False
+        self._errors: List[Exception] = []
+        self._thread = None
+    
+    def submit(self, path: Path, text: str) -> None:
+        """
+        Queues a write of text to a path.
+        """
+        with self._cond:
+            # Re-inserted, so writes are in the order of their latest submit.
+            self._pending.pop(path, None)
+            self._pending[path] = text
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+    
+    def _run(self) -> None:
+        """
+        Writer thread loop.
+        """
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                writes, self._pending = self._pending, {}
+                self._writing = True
+            
+            for path, text in writes.items():
+                try:
+                    _atomic_write(path, text)
+                except Exception as e:
+                    log.error(f"Error writing to file '{path.as_posix()}': {e}")
+                    self._errors.append(e)
+            
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+    
+    def flush(self) -> None:
+        """
+        Waits for all queued writes.
+        """
+        with self._cond:
+            while self._pending or self._writing:
+                self._cond.wait()
+            errors, self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+
+
+_write_behind = _WriteBehind()
+atexit.register(_write_behind.flush)
+
+
+def flush_writes() -> None:
+    """
+    Waits for all background writes (i.e., a barrier, e.g., at stage ends).
+    Raises the first error of a failed background write.
+    """
+    _write_behind.flush()
+
+
 def write_file(
     file_paths: Union[Union[str, Path], List[Union[str, Path]]],
-    file_writes: Union[str, List[str]]
+    file_writes: Union[str, List[str]],
+    background: bool = False
 ) -> None:
     """
-    Write a list of strings to specified file paths.
+    Write a list of strings to specified file paths. If background, the files
+    are written (atomically) by the writer thread (see `flush_writes`).
     """
     file_paths = to_list(file_paths)
     file_writes = to_list(file_writes)
     assert len(file_paths) == len(file_writes), "`file_paths` and `file_writes` must be same length."
     for idx, path in enumerate(file_paths):
         path = Path(path)
+        if background:
+            _write_behind.submit(path, file_writes[idx])
+            continue
         try:
             path.write_text(file_writes[idx])
         except Exception as e:
@@ -210,25 +376,48 @@ def write_file(
 
 def write_jsonl(
     file_path: Union[str, Path],
-    json_obj: Union[dict, List[dict]]
+    json_obj: Union[dict, Iterable[dict]],
+    background: bool = False
 ):
     """
-    Writes jsonl file from json/dict object.
+    Writes jsonl file from json/dict object(s). Objects are streamed to the 
+    file (unless background).
     """
-    json_obj = to_list(json_obj)
-    write_file(file_paths=file_path, file_writes="")
-    with open(Path(file_path), "w") as f:
-        for line in json_obj:
-            json.dump(line, f)
-            f.write("\n")
+    json_obj = [json_obj] if isinstance(json_obj, dict) else json_obj
+    if background:
+        text = "".join(json_dumps(line) + "\n" for line in json_obj)
+        write_file(file_paths=file_path, file_writes=text, background=True)
+        return None
+    try:
+        with open(Path(file_path), "w") as f:
+            for line in json_obj:
+                f.write(json_dumps(line) + "\n")
+    except Exception as e:
+        log.error(f"Error writing JSONL to file '{file_path}': {e}")
+        raise
 
 
-def write_json(file_path: Union[str, Path], data: dict, indent: int = 4) -> None:
+def write_json(
+    file_path: Union[str, Path],
+    data: dict,
+    indent: int = 4,
+    atomic: bool = False,
+    background: bool = False
+) -> None:
     """
-    Write JSON data to a file at the given path.
+    Write JSON data to a file at the given path. If atomic, the data is written
+    to a temporary file & then renamed to the path. If background, the file is
+    written (atomically) by the writer thread (see `flush_writes`).
     """
     try:
-        Path(file_path).write_text(json.dumps(data, indent=indent))
+        path = Path(file_path)
+        text = json_dumps(data, indent=indent)
+        if background:
+            _write_behind.submit(path, text)
+        elif atomic:
+            _atomic_write(path, text)
+        else:
+            path.write_text(text)
     except TypeError as e:
         log.error(f"Error serializing JSON data: {e}")
         raise
@@ -237,6 +426,13 @@ def write_json(file_path: Union[str, Path], data: dict, indent: int = 4) -> None
         raise
 
 
+def content_hash(text: str) -> str:
+    """
+    Returns the SHA-256 hash of a string.
+    """
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
 def check_directories(paths: Union[Union[str, Path], List[Union[str, Path]]]) -> bool:
     """
     Check if all given directories exist.
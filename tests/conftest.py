@@ -0,0 +1,55 @@
+"""
+Test fixtures.
+
+The LLM registry is stubbed, so tests are run w/o the provider SDKs (or API
+keys).
+"""
+import pytest
+from pathlib import Path
+
+from models.irpd.test_config import TestConfig
+from models.irpd.test_outputs import ModelInfo
+from models.irpd.config_manager import ConfigManager
+
+
+
+@pytest.fixture(autouse=True)
+def llm_registry(monkeypatch):
+    """
+    Stubs the LLM registry of the ConfigManager. ModelInfo objects are built 
+    w/o the LLM configs, & LLM instances are not created.
+    """
+    def generate_model_info(self, llm_str: str):
+        return ModelInfo(model=llm_str, parameters={})
+    
+    def generate_llm_instance(self, llm_str: str, print_reponse: bool = False):
+        raise AssertionError(f"LLM instance created in a test: {llm_str}")
+    
+    monkeypatch.setattr(ConfigManager, "generate_model_info", generate_model_info)
+    monkeypatch.setattr(ConfigManager, "generate_llm_instance", generate_llm_instance)
+    return None
+
+
+@pytest.fixture
+def make_config(tmp_path: Path):
+    """
+    Returns a factory of TestConfig objects (uni case) in a temporary test 
+    path.
+    """
+    def make_config(stages: list, replications: int = 1, **kwargs):
+        return TestConfig(
+            case="uni",
+            ra="both",
+            treatment="imperfect",
+            llms=["GPT_4O_1120"],
+            llm_config="base",
+            test_type="test",
+            test_path=tmp_path / "test",
+            data_path=tmp_path,
+            prompts_path=tmp_path,
+            stages=stages,
+            batches=False,
+            total_replications=replications,
+            **kwargs
+        )
+    return make_config
@@ -0,0 +1,45 @@
+"""
+DataStore tests.
+"""
+import pytest
+import pandas as pd
+
+from models.irpd.data_store import DataStore
+
+
+
+@pytest.fixture
+def summary_path(tmp_path):
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    path = data_path / "ra_summaries.csv"
+    pd.DataFrame({
+        "case": ["uni", "uni", "switch"],
+        "treatment": ["imperfect", "perfect", "imperfect"],
+        "window_number": [1, 2, 3],
+        "summary_1": ["a", "b", "c"]
+    }).to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_data_dir_not_written(tmp_path, summary_path, cache):
+    """
+    The data dir. is not written to, w/ or w/o the Parquet data cache.
+    """
+    cache_dir = tmp_path / "cache" if cache else None
+    df = DataStore().summaries(summary_path, ["uni"], "imperfect", cache_dir)
+    assert df["window_number"].tolist() == [1]
+    assert list(summary_path.parent.iterdir()) == [summary_path]
+
+
+def test_data_cache(tmp_path, summary_path):
+    """
+    The Parquet copy of a CSV is cached in the cache dir., & read by later 
+    processes (i.e., new DataStore objects).
+    """
+    pytest.importorskip("pyarrow")
+    cache_dir = tmp_path / "cache"
+    df = DataStore().load(summary_path, cache_dir)
+    assert len(list(cache_dir.glob("ra_summaries-*.parquet"))) == 1
+    pd.testing.assert_frame_equal(DataStore().load(summary_path, cache_dir), df)
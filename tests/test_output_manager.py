@@ -0,0 +1,218 @@
+"""
+OutputManager tests.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import flush_writes, load_json
+from models.prompts import Prompts
+from models.request_output import RequestOut, MetaOut
+from models.irpd.schemas import Stage1Schema, Stage1rSchema, Stage1cSchema, Stage2Schema
+from models.irpd.meta_writer import meta_writer
+from models.irpd.artifact_worker import artifact_worker
+from models.irpd.output_manager import OutputManager
+from models.irpd.output_processer import MANIFEST_FILE
+
+
+LLM = "GPT_4O_1120"
+
+
+
+def stage_1_output(subset: str, stage_name: str = "1"):
+    """
+    Returns a Stage 1 (or 1r & 1c) RequestOut object (10 input & 5 output 
+    tokens).
+    """
+    field = "categories" if stage_name == "1" else "refined_categories"
+    schema = {"1": Stage1Schema, "1r": Stage1rSchema, "1c": Stage1cSchema}[stage_name]
+    parsed = schema.model_validate({field: [{
+        "category_name": f"{subset} category",
+        "definition": "Definition.",
+        "examples": [{"window_number": 1, "reasoning": "Reasoning."}]
+    }]})
+    return RequestOut(
+        parsed=parsed,
+        prompts=Prompts(system="system", user=subset),
+        meta=MetaOut(input_tokens=10, output_tokens=5)
+    )
+
+
+def stage_2_output(window_number: int):
+    """
+    Returns a Stage 2 RequestOut object (10 input & 5 output tokens).
+    """
+    parsed = Stage2Schema.model_validate({
+        "window_number": window_number,
+        "assigned_categories": [{"category_name": "category"}],
+        "reasoning": "Reasoning."
+    })
+    return RequestOut(
+        parsed=parsed,
+        prompts=Prompts(system="system", user=str(window_number)),
+        meta=MetaOut(input_tokens=10, output_tokens=5)
+    )
+
+
+def test_verify_then_resume(make_config):
+    config = make_config(["2"], export_only=True)
+    output_manager = OutputManager(config)
+    stage_output = output_manager.retrieve(LLM, 1, "2", "full")[0]
+    output_manager.store_completion(stage_output, [stage_2_output(w) for w in range(1, 6)])
+    meta_writer.flush()
+    flush_writes()
+    
+    subset_path = output_manager.config_manager.generate_subset_path(1, LLM, "2", "full")
+    (subset_path / "responses" / "full_5_response.txt").unlink()
+    
+    # Verified outputs keep the manifest totals, so the resumed subset can be
+    # stored.
+    output_manager = OutputManager(config)
+    invalid = output_manager.verify()
+    stage_output = output_manager.retrieve(LLM, 1, "2", "full")[0]
+    assert len(invalid) == 1
+    assert not stage_output.complete
+    assert len(stage_output.outputs) == 4
+    
+    output_manager.store_completion(stage_output, stage_output.outputs + [stage_2_output(5)])
+    meta_writer.flush()
+    assert stage_output.complete
+    
+    manifest = load_json(subset_path / MANIFEST_FILE)
+    assert manifest["windows"] == [1, 2, 3, 4, 5]
+    assert (manifest["input_tokens"], manifest["output_tokens"]) == (60, 30)
+    
+    meta = load_json(output_manager.config_manager.generate_meta_path(1, LLM))
+    assert meta["stages"]["2"]["subsets"]["full"]["total_tokens"] == 90
+
+
+def test_concurrent_stores(make_config):
+    """
+    Stage 1 subsets (of all replications) are stored, & Stage 2 windows are
+    journaled, from concurrent threads. The reloaded test has no outputs lost
+    & no meta file torn (i.e., each is valid JSON w/ all Stage 1 subsets).
+    """
+    replications, windows = 4, 50
+    config = make_config(["1", "2"], replications=replications)
+    output_manager = OutputManager(config)
+    
+    stage_1 = output_manager.retrieve(LLM, stage_name="1")
+    stage_2 = output_manager.retrieve(LLM, stage_name="2")
+    jobs = [
+        lambda output=output: output_manager.store_completion(
+            output, stage_1_output(output.subset)
+        )
+        for output in stage_1
+    ]
+    jobs += [
+        lambda output=output, w=w: output_manager.journal_output(
+            output, stage_2_output(w)
+        )
+        for output in stage_2
+        for w in range(1, windows + 1)
+    ]
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        for future in [executor.submit(job) for job in jobs]:
+            future.result()
+    meta_writer.flush()
+    flush_writes()
+    artifact_worker.wait()
+    
+    # Reloading the test from its directory (& journals).
+    reloaded = OutputManager(config)
+    for output in reloaded.retrieve(LLM, stage_name="1", load=False):
+        assert output.complete, (output.replication, output.subset)
+    for output in reloaded.retrieve(LLM, stage_name="2", load=False):
+        assert len(output.outputs) == windows, output.replication
+    
+    subsets = set(reloaded.config_manager.get_subsets("1"))
+    for n in range(1, replications + 1):
+        meta_path = reloaded.config_manager.generate_meta_path(n, LLM)
+        meta = json.loads(meta_path.read_text())
+        assert set(meta["stages"]["1"]["subsets"]) == subsets, meta_path
+
+
+def test_response_layout(make_config):
+    """
+    Response files (& the text of RequestOut objects) keep the legacy JSON 
+    layout.
+    """
+    config = make_config(["2"], export_only=True)
+    output_manager = OutputManager(config)
+    stage_output = output_manager.retrieve(LLM, 1, "2", "full")[0]
+    output = stage_2_output(1)
+    output_manager.store_completion(stage_output, [output])
+    flush_writes()
+    
+    subset_path = output_manager.config_manager.generate_subset_path(1, LLM, "2", "full")
+    response = (subset_path / "responses" / "full_1_response.txt").read_text()
+    assert response == json.dumps(output.parsed.model_dump(), indent=2)
+    assert output.text == json.dumps(output.parsed.model_dump(), indent=4)
+
+
+def test_evicted_stages_read(make_config, monkeypatch):
+    """
+    Stages evicted (w/ `hot_stages`) by other threads are not read as empty.
+    """
+    # Widening the window between a stage being loaded & read.
+    touch_stages = OutputManager._touch_stages
+    def slow_touch_stages(self, stage_outputs):
+        touch_stages(self, stage_outputs)
+        time.sleep(0.001)
+    monkeypatch.setattr(OutputManager, "_touch_stages", slow_touch_stages)
+    
+    replications = 3
+    config = make_config(
+        ["1", "1r", "1c"], replications=replications, export_only=True, hot_stages=1
+    )
+    output_manager = OutputManager(config)
+    for stage_output in output_manager.retrieve(LLM):
+        output_manager.store_completion(
+            stage_output, stage_1_output(stage_output.subset, stage_output.stage_name)
+        )
+    flush_writes()
+    
+    def read_categories(n: int):
+        for _ in range(50):
+            assert output_manager.get_categories(LLM, n), n
+    
+    def load_stages(n: int):
+        for _ in range(50):
+            for stage_name in ("1", "1r"):
+                output_manager.read_outputs(LLM, n, stage_name)
+    
+    with ThreadPoolExecutor(max_workers=2 * replications) as executor:
+        futures = [
+            executor.submit(job, n)
+            for n in range(1, replications + 1)
+            for job in (read_categories, load_stages)
+        ]
+        for future in futures:
+            future.result()
+
+
+def test_read_only(make_config, tmp_path):
+    """
+    Read only OutputManagers (e.g., for planning) do not write to the test path
+    or check batches.
+    """
+    config = make_config(["1", "2"], export_only=True)
+    output_manager = OutputManager(config)
+    for stage_output in output_manager.retrieve(LLM, stage_name="1"):
+        output_manager.store_completion(stage_output, stage_1_output(stage_output.subset))
+    stage_output = output_manager.retrieve(LLM, 1, "2", "full")[0]
+    output_manager.journal_output(stage_output, stage_2_output(1))
+    meta_writer.flush()
+    flush_writes()
+    
+    # W/ batches, the (stubbed) LLM instance is created if batches are checked.
+    config.batches = True
+    files = {path: path.stat().st_mtime_ns for path in config.test_path.rglob("*")}
+    output_manager = OutputManager(config, read_only=True)
+    assert files == {path: path.stat().st_mtime_ns for path in config.test_path.rglob("*")}
+    assert all(output.complete for output in output_manager.retrieve(LLM, stage_name="1"))
+    assert len(output_manager.retrieve(LLM, 1, "2", "full")[0].outputs) == 1
+    
+    config.test_path = tmp_path / "new_test"
+    OutputManager(config, read_only=True)
+    assert not config.test_path.exists()
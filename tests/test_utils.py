@@ -0,0 +1,42 @@
+"""
+Utils tests.
+"""
+import pytest
+
+import utils
+from tools.functions import records_to_txt
+
+
+RECORD = {"window_number": 1, "summary": "Café – naïve", "score": float("nan"), 2: [1.5, None]}
+
+
+
+@pytest.mark.parametrize("indent", [None, 2, 4])
+def test_json_dumps_backends(monkeypatch, indent):
+    """
+    The JSON backends (orjson, msgspec, & stdlib) write the same JSON string.
+    """
+    dumps = {}
+    for backend in ("orjson", "msgspec"):
+        if getattr(utils, backend):
+            dumps[backend] = utils.json_dumps(RECORD, indent=indent)
+            monkeypatch.setattr(utils, backend, None)
+    dumps["json"] = utils.json_dumps(RECORD, indent=indent)
+    
+    assert len(set(dumps.values())) == 1, dumps
+    assert "Café – naïve" in dumps["json"]
+    assert utils.json_loads(dumps["json"])["score"] is None
+
+
+def test_records_to_txt_json_backends(monkeypatch):
+    """
+    JSON user prompts are the same for each JSON backend.
+    """
+    records = [{"window_number": 1, "summary": "Café", "score": float("nan")}]
+    prompts = {records_to_txt(records, user_format) for user_format in ("json", "abbrev")}
+    monkeypatch.setattr(utils, "orjson", None)
+    monkeypatch.setattr(utils, "msgspec", None)
+    assert prompts == {records_to_txt(records, user_format) for user_format in ("json", "abbrev")}
+    assert records_to_txt(records, "json") == (
+        '{"columns":["window_number","summary","score"],"rows":[[1,"Café",null]]}'
+    )